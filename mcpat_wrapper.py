@@ -1,10 +1,20 @@
 import os
 import re
 import copy
+import errno
+import fcntl
+import io
+import itertools
+import signal
 import json
+import math
 import subprocess
+import threading
 import time
-import xml.etree.ElementTree as ET
+import weakref
+import zlib
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
 
 # -------------------------------------------------------------------------------
 # McPat Version 1.3 wrapper for generating energy estimations of architecture components
@@ -14,6 +24,35 @@ MCPAT_ACCURACY = 80  # in your metric, please set the accuracy you think McPat's
 
 MUL_FACTOR = 1000000  # averaging factor for McPAT
 CACHE_TIMEOUT = 30    # cache timeout in days
+FAILURE_TIMEOUT = 1   # days a configuration McPat failed on is rejected without running McPat again
+CACHE_BACKEND = os.environ.get("MCPAT_CACHE_BACKEND", "sqlite")  # "sqlite", "json" or "shared", see cache_backends
+CACHE_DIR = os.environ.get("MCPAT_CACHE_DIR")  # where the cache lives, defaults to the plug-in directory
+MCPAT_EXEC = os.environ.get("MCPAT_EXEC")  # path of the McPat executable, searched for if not set
+SCRATCH_DIR = os.environ.get("MCPAT_SCRATCH_DIR")  # where McPat input/output files go, defaults to tmpfs if available
+HARVEST_ACTIONS = False  # on a cache miss, also run McPat for every other action of the component
+CORES_PER_QUERY = 1   # number of core components batched into one McPat run as heterogeneous cores, 1 disables it
+COMPONENT_MEMO_SIZE = 4096  # interfaces whose component is kept for the next call, see ComponentMemo
+SURROGATE = False     # answer uncached queries from a fit of earlier results when it is accurate enough, see Surrogate
+SURROGATE_ERROR = 0.05  # largest cross-validated relative error of a fit that answers queries
+SURROGATE_SAMPLES = 4   # McPat results a fit needs at least
+MINIMAL_SYSTEM = False  # evaluate components in the smallest system McPat needs for them, see McPatComponent
+DERIVE_RESULTS = False  # answer uncached queries from results at a nearby clock or technology node, see ResultScaling
+CLOCK_RANGE = 0.1       # largest relative clock difference across which a result is reused
+DERIVED_ACCURACY = {"clock": 75, "technology": 60}  # accuracy reported for results derived each way
+SOCKET_PATH = os.environ.get("MCPAT_SOCKET")  # where the daemon listens, see McPatClient and default_socket_path
+MCPAT_TIMEOUT = float(os.environ.get("MCPAT_TIMEOUT", 300))  # seconds a McPat run may take before it is killed
+MCPAT_RETRIES = 2     # further attempts after a McPat run times out or is killed by a signal
+RETRY_BACKOFF = 1     # seconds before the first retry, doubled for every further one
+MCPAT_PROCESSES = os.cpu_count() or 1  # McPat processes the async interface runs at once
+
+
+class McPatError(Exception):
+    """ McPat could not evaluate a configuration, the failure is remembered for FAILURE_TIMEOUT days """
+
+
+class McPatInterrupted(McPatError):
+    """ McPat timed out or was killed by a signal, which says nothing about the configuration and is not remembered """
+
 
 class McPatWrapper:
     """
@@ -23,14 +62,47 @@ class McPatWrapper:
     # -------------------------------------------------------------------------------------
     # Interface functions, function name, input arguments, and output have to adhere
     # -------------------------------------------------------------------------------------
-    def __init__(self, clean_output_files=True, verbose=True):
+    def __init__(self, clean_output_files=True, verbose=True, cores_per_query=CORES_PER_QUERY,
+                 harvest_actions=HARVEST_ACTIONS, cache_backend=CACHE_BACKEND, cache_dir=CACHE_DIR,
+                 exec_path=MCPAT_EXEC, timeout=MCPAT_TIMEOUT, retries=MCPAT_RETRIES, surrogate=SURROGATE,
+                 derive_results=DERIVE_RESULTS, max_processes=MCPAT_PROCESSES):
         self.estimator_name = "McPat"
-        self.exec_path = search_for_mcpat_exec_path()
         self.clean_output_files = clean_output_files
         self.verbose = verbose
-        self.cache = {}
-        self.cache_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), ".cache")
-        self.load_cache()  # enable data caching across invocations
+        self.cores_per_query = cores_per_query
+        self.harvest_actions = harvest_actions
+        self.cache_backend = cache_backend
+        self.cache_dir = cache_dir or os.path.dirname(os.path.realpath(__file__))
+        self.timeout = timeout
+        self.retries = retries
+        self.max_processes = max_processes
+        # the executable and the cache are only looked up once needed, so construction stays cheap
+        self._exec_path = exec_path
+        self._cache = None
+        self.inflight = InflightLocks(self.cache_dir)
+        self.components = ComponentMemo(COMPONENT_MEMO_SIZE)
+        self.surrogate = Surrogate(SURROGATE_ERROR, SURROGATE_SAMPLES) if surrogate else None
+        self.scaling = ResultScaling(CLOCK_RANGE) if derive_results else None
+        self._lazy_lock = threading.Lock()
+        self._seeded = set()  # classes whose cached results the models have been fed
+        self._seed_lock = threading.Lock()
+        self._process_slots = weakref.WeakKeyDictionary()  # event loop: semaphore limiting its McPat processes
+        self._async_runs = weakref.WeakKeyDictionary()     # event loop: {input_key: McPat run in progress}
+
+    @property
+    def exec_path(self):
+        with self._lazy_lock:
+            if self._exec_path is None:
+                self._exec_path = search_for_mcpat_exec_path(self.cache_dir)
+            return self._exec_path
+
+    @property
+    def cache(self):
+        # enable data caching across invocations
+        with self._lazy_lock:
+            if self._cache is None:
+                self._cache = cache_backends[self.cache_backend](self.cache_dir)
+            return self._cache
 
     def primitive_action_supported(self, interface):
         """
@@ -48,11 +120,12 @@ class McPatWrapper:
 
         """
         if interface['class_name'] in components:
-            try:
-                component = components[interface['class_name']](interface)
-            except:
-                return 0
-            if component.action_supported():
+            component, action_supported, _ = self.components.get(interface)
+            if action_supported and self.cache.get_failure(component.input_key()) is None:
+                if (self.surrogate is not None or self.scaling is not None) and self.lookup(component) is None:
+                    approximation = self.approximate(component)
+                    if approximation is not None:
+                        return approximation[2]
                 return MCPAT_ACCURACY
             else:
                 return 0
@@ -71,24 +144,20 @@ class McPatWrapper:
        :rtype float
 
         """
-        component = components[interface['class_name']](interface)
-        key = component.key
+        component = self.component(interface)
 
-        identifier = interface["class_name"]
-        if "type" in interface["attributes"]:
-            identifier += " " + interface["attributes"]["type"]
-        identifier += " " + interface["action_name"]
-
-        if key in self.cache:
+        result = self.lookup(component)
+        if result is not None:
             if self.verbose:
-                print("Info: accelergy-mcpat-plugin [%s] cached=1 energy=%fpJ area=%fmm^2" % (identifier, self.cache[key][0], self.cache[key][1]))
-            return self.cache[key][0]
+                print("Info: accelergy-mcpat-plugin [%s] cached=1 energy=%fpJ area=%fmm^2" % (component.identifier(), result[0], result[1]))
+            return result[0]
         else:
-            energy, area = self.query_mcpat(component)
-            self.write_cache(key, energy, area)
-            if self.verbose:
-                print("Info: accelergy-mcpat-plugin [%s] cached=0 energy=%fpJ area=%fmm^2" % (identifier, energy, area))
-            return energy
+            self.check_failure(component)
+            approximation = self.approximate(component, report=True)
+            if approximation is not None:
+                return approximation[0]
+            self.run_queries(self.harvest(component), required=[component.key])
+            return self.lookup(component)[0]
 
     def primitive_area_supported(self, interface):
 
@@ -105,11 +174,8 @@ class McPatWrapper:
 
         """
         if interface['class_name'] in components:
-            try:
-                component = components[interface['class_name']](interface)
-            except:
-                return 0
-            if component.attr_supported():
+            _, _, attr_supported = self.components.get(interface)
+            if attr_supported:
                 return MCPAT_ACCURACY
             else:
                 return 0
@@ -128,76 +194,836 @@ class McPatWrapper:
         :rtype: float
 
         """
-        component = components[interface['class_name']](interface)
-        key = component.key
-        if key in self.cache:
-            return self.cache[key][1]
-        else:
-            energy, area = self.query_mcpat(component)
-            self.write_cache(key, energy, area)
+        component = self.component(interface)
+        area = self.cache.get_area(component.area_key())
+        if area is not None:
             return area
+        else:
+            self.check_failure(component)
+            approximation = self.approximate(component, report=True)
+            if approximation is not None:
+                return approximation[1]
+            self.run_queries(self.harvest(component), required=[component.key])
+            return self.lookup(component)[1]
+
+    def estimate_batch(self, interfaces, max_workers=None):
+        """
+        :param interfaces: list of interfaces, each as passed to estimate_energy
+        :type interfaces: list
+        :param max_workers: maximum number of McPat processes run at once, defaults to the number of CPUs
 
-    def load_cache(self):
-        if os.path.exists(self.cache_file):
-            entries = []
-            with open(self.cache_file, "r") as file:
-                for line in file.readlines():
-                    entry = json.loads(line)
-                    entry_time = entry[3]
-                    current_time = time.time()
-                    timeout = CACHE_TIMEOUT * 86400
-                    if current_time > entry_time > current_time - timeout:
-                        entries.append(entry)
-            with open(self.cache_file, "w") as file:
-                for entry in entries:
-                    json.dump(entry, file)
-                    file.write("\n")
-                    self.cache[tuple(entry[0])] = (entry[1], entry[2])
+        :return the estimated energies, in the same order as interfaces
+        :rtype list of float
 
-    def write_cache(self, key, energy, area):
-        self.cache[key] = (energy, area)
-        with open(self.cache_file, "a") as file:
-            json.dump([key, energy, area, time.time()], file)
-            file.write("\n")
+        """
+        batch = []
+        misses = []
+        for interface in interfaces:
+            component = self.component(interface)
+            batch.append(component)
+            if self.lookup(component) is None:
+                misses.extend(self.harvest(component))
+        self.run_queries(misses, max_workers, required=[component.key for component in batch])
+        return [self.lookup(component)[0] for component in batch]
+
+    def sweep(self, class_name, base_attributes, axes, actions, max_workers=None):
+        """
+        :param class_name: component class, as in an interface
+        :param base_attributes: attributes shared by every point of the sweep
+        :param axes: attribute name: list of values, the sweep covers the Cartesian product of the lists
+        :param actions: names of the actions estimated at every point
+        :param max_workers: maximum number of McPat processes run at once, defaults to the number of CPUs
 
-    def query_mcpat(self, component):
-        dir_path = os.path.dirname(os.path.realpath(__file__))
-        action_name = component.interface["action_name"]
-        properties_path = os.path.join(dir_path, "properties-%s-%s.xml" % (component.name, action_name))
-        output_path = os.path.join(dir_path, "mcpat-%s-%s" % (component.name, action_name))
+        :return the energy, with shape (len(actions), *axis lengths) in the order of axes, and the area, with
+        shape (*axis lengths). Points the component does not support or McPat fails on are NaN.
+        :rtype (numpy.ndarray, numpy.ndarray)
+
+        """
+        import numpy  # only sweeps need NumPy, the plug-in itself does not
+
+        names = list(axes)
+        shape = tuple(len(axes[name]) for name in names)
+        energy = numpy.full((len(actions),) + shape, numpy.nan)
+        area = numpy.full(shape, numpy.nan)
+
+        # sweep points are not kept in the component memo, they would only evict the interfaces Accelergy reuses
+        points = []
+        for index in itertools.product(*[range(length) for length in shape]):
+            attributes = {**base_attributes, **{name: axes[name][i] for name, i in zip(names, index)}}
+            for action_index, action_name in enumerate(actions):
+                interface = {"class_name": class_name, "attributes": attributes, "action_name": action_name,
+                             "arguments": None}
+                component, action_supported, _ = ComponentMemo.build(interface)
+                if action_supported:
+                    points.append(((action_index,) + index, component))
+
+        misses = [component for _, component in points
+                  if self.lookup(component) is None and self.cache.get_failure(component.input_key()) is None]
+        self.run_queries(misses, max_workers, required=[])
+        for position, component in points:
+            result = self.lookup(component)
+            if result is not None:
+                energy[position] = result[0]
+                area[position[1:]] = result[1]
+        return energy, area
+
+    def component(self, interface):
+        """ the component of the interface, shared by every call with an equal interface """
+        component = self.components.get(interface)[0]
+        if component is None:
+            component = components[interface['class_name']](interface)  # raises the error that prevented building it
+        return component
+
+    def lookup(self, component):
+        """ the cached (energy, area) of the component, or None """
+        result = self.cache.get(component.key)
+        if result is None and component.static:
+            # leakage does not depend on the activity, any earlier run of the same hardware reported it
+            leakage = self.cache.get_leakage(component.area_key())
+            if leakage is not None:
+                result = (leakage, self.cache.get_area(component.area_key()))
+        if result is not None:
+            for model in (self.scaling, self.surrogate):
+                if model is not None:
+                    model.add(component, result)
+        return result
+
+    def approximate(self, component, report=False):
+        """
+        (energy, area, accuracy) of an uncached component, derived from McPat results of the same hardware at
+        another clock or technology node, or else predicted by the surrogate. None when McPat has to answer.
+        """
+        approximation = None
+        self.seed(component)
+        derived = self.scaling.derive(component) if self.scaling is not None else None
+        if derived is not None:
+            approximation = (derived[0], derived[1], DERIVED_ACCURACY[derived[2]])
+            method = "derived=" + derived[2]
+        elif self.surrogate is not None:
+            prediction = self.surrogate.predict(component)
+            if prediction is not None:
+                approximation = (prediction[0], prediction[1], int(round(MCPAT_ACCURACY * (1 - prediction[2]))))
+                method = "surrogate=1 error=%.1f%%" % (prediction[2] * 100)
+        if approximation is not None and report and self.verbose:
+            print("Info: accelergy-mcpat-plugin [%s] %s accuracy=%d energy=%fpJ area=%fmm^2" %
+                  (component.identifier(), method, approximation[2], approximation[0], approximation[1]))
+        return approximation
+
+    def seed(self, component):
+        """ feeds result scaling and the surrogate every cached result of the component's class, once per class """
+        class_name = component.interface["class_name"]
+        models = [model for model in (self.scaling, self.surrogate) if model is not None]
+        with self._seed_lock:
+            if not models or class_name in self._seeded:
+                return
+            self._seeded.add(class_name)
+            for key, interface, result in self.cache.get_class_results(class_name):
+                try:
+                    cached = components[class_name](interface)
+                except Exception:
+                    continue
+                if cached.key == key:  # results of an older template or component model do not apply
+                    for model in models:
+                        model.add(cached, result)
+
+    def check_failure(self, component):
+        """ raises the recorded error if McPat already failed on the component's input """
+        error = self.cache.get_failure(component.input_key())
+        if error is not None:
+            raise McPatError(error)
+
+    @contextmanager
+    def recording_failures(self, component):
+        # a configuration McPat cannot evaluate is remembered, so asking again does not repeat the failing run
+        try:
+            yield
+        except McPatInterrupted:
+            raise
+        except McPatError as error:
+            self.cache.put_failure(component.input_key(), str(error))
+            raise
+
+    def harvest(self, component):
+        """ the component plus, when harvesting actions, its uncached sibling actions """
+        if not self.harvest_actions:
+            return [component]
+        return [component] + [sibling for sibling in component.sibling_components()
+                              if self.lookup(sibling) is None and self.cache.get_failure(sibling.input_key()) is None]
+
+    def run_queries(self, pending, max_workers=None, required=None):
+        """
+        runs McPat for the pending components in parallel and caches the results. The failure of a component whose
+        key is in required, or of any component if required is None, is raised. The others are only recorded, a
+        harvested sibling that fails does not concern the caller.
+        """
+        misses = {}
+        for component in pending:
+            misses.setdefault(component.key, component)
+
+        # components living in the core can share one McPat run as heterogeneous cores, and components with the
+        # same input, such as an action and the idle state of one component, share a run in any case
+        packable = {}
+        inputs = {}
+        for component in misses.values():
+            if self.cores_per_query > 1 and component.core_local:
+                packable.setdefault(component.system_key(), []).append(component)
+            else:
+                inputs.setdefault(component.input_key(), []).append(component)
+        groups = list(inputs.values())
+        for pending in packable.values():
+            for i in range(0, len(pending), self.cores_per_query):
+                groups.append(pending[i:i + self.cores_per_query])
+
+        if len(groups) == 1:
+            self.evaluate(groups[0], required)
+        elif groups:
+            from concurrent.futures import ThreadPoolExecutor
+            # McPat is CPU bound, more processes than CPUs only compete for them
+            with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+                for future in [executor.submit(self.evaluate, group, required) for group in groups]:
+                    future.result()
+
+    def evaluate(self, group, required=None):
+        """
+        runs McPat for a group of components and caches the results, unless someone else already did. A component
+        McPat fails on does not stop the others. Once they are cached, its error is raised if its key is in required,
+        or required is None.
+        """
+        # whoever holds the keys runs McPat, everyone waiting on them finds the results in the cache afterwards
+        with self.inflight.hold([component.key for component in group]):
+            pending = [component for component in group if self.lookup(component) is None]
+            results = {}
+            errors = {}
+            unreported = []
+            # a report of the same input, left by a query for another unit, spares the McPat run
+            for component in pending:
+                try:
+                    self.check_failure(component)
+                    report = self.cache.get_report(component.input_key())
+                    if report is None:
+                        unreported.append(component)
+                        continue
+                    with self.recording_failures(component):
+                        results[component.key] = parse_mcpat_output(report, component)
+                except McPatError as error:
+                    errors[component.key] = error
+            if len({component.input_key() for component in unreported}) > 1:
+                try:
+                    results.update(zip([component.key for component in unreported],
+                                       self.query_mcpat_cores(unreported)))
+                    unreported = []
+                except McPatInterrupted as error:
+                    # running every component one at a time would only time out once each, but the ones the caller
+                    # asked for may not be the ones that hung, so those are run alone
+                    alone = [component for component in unreported
+                             if required is not None and component.key in required]
+                    errors.update((component.key, error) for component in unreported if component not in alone)
+                    unreported = alone
+                except McPatError:
+                    pass  # one of the packed components broke the run, evaluating them one at a time finds out which
+            for component in unreported:
+                try:
+                    # the run for a component sharing this input may have just reported or failed on it
+                    self.check_failure(component)
+                    report = self.cache.get_report(component.input_key())
+                    with self.recording_failures(component):
+                        if report is not None:
+                            results[component.key] = parse_mcpat_output(report, component)
+                        else:
+                            results[component.key] = self.query_mcpat(component)
+                except McPatError as error:
+                    errors[component.key] = error
+            for component in pending:
+                if component.key in results:
+                    self.store(component, results[component.key])
+            for key, error in errors.items():
+                if required is None or key in required:
+                    raise error
+
+    def mcpat_report(self, interface):
+        """
+        :param interface: as passed to estimate_energy
+
+        :return the full McPat report of the interface's input, as a tree of
+        {"name": unit name, "metrics": {metric name: value}, "units": [sub-units]}
+        :rtype dict
+
+        """
+        component = self.component(interface)
+        report = self.cache.get_report(component.input_key())
+        if report is None:
+            self.query_mcpat(component)
+            report = self.cache.get_report(component.input_key())
+        return report_tree(report)
+
+    def store(self, component, result):
+        energy, area, leakage = result
+        self.write_cache(component.key, energy, area, component.area_key(), leakage, component.description())
+        if self.verbose:
+            print("Info: accelergy-mcpat-plugin [%s] cached=0 energy=%fpJ area=%fmm^2" %
+                  (component.identifier(), energy, area))
+
+    def write_cache(self, key, energy, area, area_key=None, leakage=None, interface=None):
+        self.cache.put(key, energy, area, area_key, leakage, interface)
+
+    @staticmethod
+    def mcpat_input(component):
         properties = Properties()
-        for path, value in component.properties.items():
-            success = properties.replace(path, value)
-            if not success:
-                raise Exception("Could not locate property %s" % path)
-        properties.write(properties_path)
-
-        # call mcpat
-        exec_list = [self.exec_path, '-infile', properties_path, "-print_level", "5"]
-        with open(output_path, "w") as file:
-            subprocess.call(exec_list, stdout=file)
-
-        # parse mcpat output
-        with open(output_path, "r") as file:
-            output_string = file.read()
-            energy = 0
-            area = 0
-            for mcpat_pattern in component.mcpat_patterns:
-                pattern = re.compile(mcpat_pattern + r"[\w\W]*?Area = ([^\s]*)[\w\W]*?Runtime Dynamic = ([^\s]*)")
-                match = pattern.search(output_string)
-                if match:
-                    energy += float(match.group(2)) * 10 ** 12 / (
-                              int(component.clockrate) * 10 ** 6)  # W to pJ conversion
-                    area += float(match.group(1))
+        properties.update(component.all_properties())
+        return properties
+
+    def query_mcpat(self, component):
+        output_string = self.run_mcpat(self.mcpat_input(component), component.run_name())
+        report = parse_mcpat_report(output_string)
+        result = parse_mcpat_output(report, component)  # an incomplete report is not kept, its failure is
+        self.cache.put_report(component.input_key(), report)
+        return result
+
+    def query_mcpat_cores(self, core_components):
+        """
+        evaluates several core components in one McPat run, each one modelled as its own core of a
+        heterogeneous system. All components must be core_local and share the same system_key.
+        """
+        if len(core_components) == 1:
+            return [self.query_mcpat(core_components[0])]
+        properties = Properties(number_of_cores=len(core_components))
+        properties.update(core_components[0].all_properties())
+        properties.update({"system.number_of_cores": len(core_components), "system.homogeneous_cores": 0})
+        for core_index, component in enumerate(core_components):
+            properties.update(component.core_properties(core_index))
+        output_string = self.run_mcpat(properties, "cores-%d" % len(core_components))
+
+        sections = split_core_sections(parse_mcpat_report(output_string))
+        if len(sections) != len(core_components):
+            raise McPatError("Expected %d cores in McPat output, found %d" % (len(core_components), len(sections)))
+        return [parse_mcpat_output(section, component) for section, component in zip(sections, core_components)]
+
+    @contextmanager
+    def scratch_files(self, properties, name):
+        """ writes the McPat input to a directory of its own and yields the McPat command and the output path """
+        # every query gets its own directory so concurrent queries never share files
+        import tempfile
+        scratch_dir = tempfile.mkdtemp(prefix="mcpat-%s-" % name, dir=search_for_scratch_dir())
+        properties_path = os.path.join(scratch_dir, "properties.xml")
+        try:
+            properties.write(properties_path)
+            yield [self.exec_path, '-infile', properties_path, "-print_level", "5"], \
+                os.path.join(scratch_dir, "mcpat.out")
+        finally:
+            if self.clean_output_files:
+                import shutil
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def run_mcpat(self, properties, name):
+        with self.scratch_files(properties, name) as (exec_list, output_path):
+            # call mcpat, its output comes back through a pipe. A run that hangs is killed and an interrupted run
+            # retried, so one pathological query cannot stall the whole flow
+            attempts = self.retries + 1
+            for attempt in range(attempts):
+                if attempt:
+                    time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+                try:
+                    returncode, output, errors = run_process_group(exec_list, self.timeout)
+                except subprocess.TimeoutExpired:
+                    failure, error = "timed out after %gs" % self.timeout, McPatInterrupted
                 else:
-                    raise Exception("Unable to find component " + mcpat_pattern + " in McPat output")
-        if self.clean_output_files:
-            os.remove(properties_path)
-            os.remove(output_path)
-        return energy, area
+                    if returncode == 0:
+                        break
+                    failure, error = exit_status(returncode, errors)
+                self.report_failure(name, failure, attempt, attempts, error)
+            return self.mcpat_output(output, output_path)
+
+    def report_failure(self, name, failure, attempt, attempts, error):
+        # McPat exits with the same status for the same input, only a timeout or a signal is worth another attempt.
+        # Any other failure, or the failure of the last attempt, is raised as error
+        if self.verbose:
+            print("Warn: accelergy-mcpat-plugin [%s] McPat %s (attempt %d of %d)" %
+                  (name, failure, attempt + 1, attempts))
+        if error is not McPatInterrupted:
+            raise error("McPat run for %s %s" % (name, failure))
+        if attempt + 1 == attempts:
+            raise error("McPat run for %s %s, giving up after %d attempts" % (name, failure, attempts))
+
+    def mcpat_output(self, output, output_path):
+        output_string = output.decode(errors="replace")
+        if not self.clean_output_files:
+            with open(output_path, "w") as file:
+                file.write(output_string)  # kept for inspection only
+        return output_string
+
+    # -------------------------------------------------------------------------------------
+    # asyncio interface, McPat runs as asyncio subprocesses and cache lookups stay synchronous
+    # -------------------------------------------------------------------------------------
+    async def estimate_energy_async(self, interface):
+        """ estimate_energy without blocking the event loop while McPat runs """
+        component = self.component(interface)
+        result = self.lookup(component)
+        if result is not None:
+            if self.verbose:
+                print("Info: accelergy-mcpat-plugin [%s] cached=1 energy=%fpJ area=%fmm^2" %
+                      (component.identifier(), result[0], result[1]))
+            return result[0]
+        self.check_failure(component)
+        approximation = self.approximate(component, report=True)
+        if approximation is not None:
+            return approximation[0]
+        await self.evaluate_all_async(self.harvest(component), [component.key])
+        return self.lookup(component)[0]
+
+    async def estimate_area_async(self, interface):
+        """ estimate_area without blocking the event loop while McPat runs """
+        component = self.component(interface)
+        area = self.cache.get_area(component.area_key())
+        if area is not None:
+            return area
+        self.check_failure(component)
+        approximation = self.approximate(component, report=True)
+        if approximation is not None:
+            return approximation[1]
+        await self.evaluate_all_async(self.harvest(component), [component.key])
+        return self.lookup(component)[1]
+
+    async def estimate_batch_async(self, interfaces):
+        """ estimate_batch without blocking the event loop, at most max_processes McPat processes run at once """
+        batch = [self.component(interface) for interface in interfaces]
+        misses = {}
+        for component in batch:
+            if self.lookup(component) is None:
+                for pending in self.harvest(component):
+                    misses.setdefault(pending.key, pending)
+        await self.evaluate_all_async(list(misses.values()), [component.key for component in batch])
+        return [self.lookup(component)[0] for component in batch]
+
+    async def evaluate_all_async(self, pending, required):
+        """ evaluate_async for every pending component at once, raising only the failures of the required keys """
+        import asyncio
+        outcomes = await asyncio.gather(*[self.evaluate_async(component) for component in pending],
+                                        return_exceptions=True)
+        for component, outcome in zip(pending, outcomes):
+            if isinstance(outcome, BaseException) and \
+                    (component.key in required or not isinstance(outcome, McPatError)):
+                raise outcome
+
+    async def evaluate_async(self, component):
+        """ evaluate for one component, components of the same input wait on a single McPat run """
+        import asyncio
+        if self.lookup(component) is not None:
+            return
+        self.check_failure(component)
+        input_key = component.input_key()
+        report = self.cache.get_report(input_key)
+        if report is None:
+            runs = self._async_runs.setdefault(asyncio.get_event_loop(), {})
+            if input_key not in runs:
+                runs[input_key] = asyncio.ensure_future(self.report_async(component))
+                runs[input_key].add_done_callback(lambda run: runs.pop(input_key, None))
+            report = await asyncio.shield(runs[input_key])  # a cancelled waiter leaves the run to the others
+        with self.recording_failures(component):
+            result = parse_mcpat_output(report, component)
+        self.store(component, result)
+
+    async def report_async(self, component):
+        with self.recording_failures(component):
+            output_string = await self.run_mcpat_async(self.mcpat_input(component), component.run_name())
+            report = parse_mcpat_report(output_string)
+            parse_mcpat_output(report, component)  # an incomplete report is not kept, its failure is
+        self.cache.put_report(component.input_key(), report)
+        return report
+
+    async def run_mcpat_async(self, properties, name):
+        import asyncio
+        # asyncio primitives belong to one event loop, so every loop gets its own limit
+        loop = asyncio.get_event_loop()
+        if loop not in self._process_slots:
+            self._process_slots[loop] = asyncio.Semaphore(self.max_processes)
+        attempts = self.retries + 1
+        for attempt in range(attempts):
+            if attempt:
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            # the input is only written once a process may start, queued queries take no scratch space
+            async with self._process_slots[loop]:
+                with self.scratch_files(properties, name) as (exec_list, output_path):
+                    try:
+                        returncode, output, errors = await run_process_group_async(exec_list, self.timeout)
+                    except asyncio.TimeoutError:
+                        failure, error = "timed out after %gs" % self.timeout, McPatInterrupted
+                    else:
+                        if returncode == 0:
+                            return self.mcpat_output(output, output_path)
+                        failure, error = exit_status(returncode, errors)
+            self.report_failure(name, failure, attempt, attempts, error)
+
+
+class McPatClient:
+    """
+    the plug-in interface of McPatWrapper, answered by the daemon started with `python3 mcpat_wrapper.py`. The
+    daemon keeps one warm cache, component memo and set of McPat runs for every client on the host, so a client
+    starts in no time. Without a daemon listening, the client answers from a McPatWrapper of its own.
+    """
 
+    methods = ["primitive_action_supported", "primitive_area_supported", "estimate_energy", "estimate_area",
+               "estimate_batch", "sweep", "mcpat_report"]
+
+    def __init__(self, socket_path=SOCKET_PATH, **wrapper_arguments):
+        self.estimator_name = "McPat"
+        self.socket_path = socket_path or default_socket_path()
+        self.wrapper_arguments = wrapper_arguments  # for the local wrapper, the daemon has its own settings
+        self.connection = None
+        self.wrapper = None
+        self.lock = threading.Lock()  # one request at a time on the connection
+
+    def primitive_action_supported(self, interface):
+        return self.call("primitive_action_supported", interface)
 
-def search_for_mcpat_exec_path():
+    def primitive_area_supported(self, interface):
+        return self.call("primitive_area_supported", interface)
+
+    def estimate_energy(self, interface):
+        return self.call("estimate_energy", interface)
+
+    def estimate_area(self, interface):
+        return self.call("estimate_area", interface)
+
+    def estimate_batch(self, interfaces, max_workers=None):
+        return self.call("estimate_batch", interfaces, max_workers)
+
+    def sweep(self, class_name, base_attributes, axes, actions, max_workers=None):
+        result = self.call("sweep", class_name, base_attributes, axes, actions, max_workers)
+        if self.wrapper is not None:
+            return result
+        import numpy
+        return numpy.array(result[0], dtype=float), numpy.array(result[1], dtype=float)
+
+    def mcpat_report(self, interface):
+        return self.call("mcpat_report", interface)
+
+    def connect(self):
+        # the caller holds self.lock. Interfaces and results only go to a daemon of the same user
+        import socket
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            if owned_socket(self.socket_path):
+                connection.connect(self.socket_path)
+                if peer_uid(connection) == os.getuid():
+                    self.connection = connection.makefile("rwb")
+                    return
+            elif os.path.lexists(self.socket_path):
+                print("Warn: accelergy-mcpat-plugin %s belongs to another user, not connecting" % self.socket_path)
+        except OSError:
+            pass
+        connection.close()
+        self.wrapper = McPatWrapper(**self.wrapper_arguments)
+
+    def call(self, method, *arguments):
+        with self.lock:
+            if self.connection is None and self.wrapper is None:
+                self.connect()
+            if self.connection is not None:
+                try:
+                    self.connection.write(json.dumps({"method": method, "arguments": arguments}).encode() + b"\n")
+                    self.connection.flush()
+                    line = self.connection.readline()
+                except OSError:
+                    line = b""
+                if not line:
+                    self.connection = None  # the next call connects again, or falls back to a local wrapper
+                    raise Exception("McPat daemon at %s closed the connection" % self.socket_path)
+        if self.wrapper is not None:
+            return getattr(self.wrapper, method)(*arguments)
+        response = json.loads(line)
+        if "error" in response:
+            error = {"McPatError": McPatError, "McPatInterrupted": McPatInterrupted}.get(response["type"], Exception)
+            raise error(response["error"])
+        return response["result"]
+
+
+def answer_requests(wrapper, rfile, wfile):
+    # one JSON request per line, answered by one JSON response per line, for as long as the client stays connected
+    for line in rfile:
+        try:
+            request = json.loads(line)
+            if request["method"] not in McPatClient.methods:
+                raise Exception("Unknown method %s" % request["method"])
+            result = getattr(wrapper, request["method"])(*request["arguments"])
+            if request["method"] == "sweep":
+                result = [array.tolist() for array in result]
+            response = {"result": result}
+        except Exception as error:
+            response = {"error": str(error), "type": type(error).__name__}
+        wfile.write(json.dumps(response).encode() + b"\n")
+        wfile.flush()
+
+
+def serve(socket_path=SOCKET_PATH, **wrapper_arguments):
+    """ answers McPatClient requests on the Unix socket until interrupted """
+    # only the daemon needs these, they are not imported with the plug-in
+    import socket
+    import socketserver
+    import stat
+
+    socket_path = socket_path or default_socket_path()
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            answer_requests(self.server.wrapper, self.rfile, self.wfile)
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    # another user who can change the directory could swap the socket for one of their own
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    status = os.stat(socket_dir)
+    if status.st_uid not in (0, os.getuid()) or status.st_mode & 0o022 and not status.st_mode & stat.S_ISVTX:
+        raise Exception("Other users can change %s, not listening there" % socket_dir)
+    if os.path.lexists(socket_path):
+        if not owned_socket(socket_path):
+            raise Exception("%s exists and is not a socket of this user" % socket_path)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)  # left behind by a daemon that was killed
+        else:
+            raise Exception("A McPat daemon is already listening on %s" % socket_path)
+        finally:
+            probe.close()
+
+    # everything a first query would otherwise wait for
+    wrapper = McPatWrapper(**wrapper_arguments)
+    wrapper.exec_path
+    wrapper.cache
+    Properties.tokenized(1)
+
+    umask = os.umask(0o177)  # only the user running the daemon may connect
+    try:
+        server = Server(socket_path, RequestHandler)
+        server.wrapper = wrapper
+    finally:
+        os.umask(umask)
+    if wrapper.verbose:
+        print("Info: accelergy-mcpat-plugin listening on %s" % socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def default_socket_path():
+    # the user's runtime directory, or else a directory of the user's own in the temporary directory
+    import tempfile
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(tempfile.gettempdir(), "mcpat-%d" % os.getuid())
+    return os.path.join(runtime_dir, "mcpat.sock")
+
+
+def owned_socket(socket_path):
+    """ whether socket_path is a socket of the user running the plug-in """
+    import stat
+    try:
+        status = os.lstat(socket_path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(status.st_mode) and status.st_uid == os.getuid()
+
+
+def peer_uid(connection):
+    # the user of the process at the other end, the socket file could have been replaced since it was checked
+    import socket
+    if not hasattr(socket, "SO_PEERCRED"):
+        return os.getuid()  # no peer credentials on this platform, the owner check before connecting has to do
+    import struct
+    credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", credentials)[1]
+
+
+def run_process_group(exec_list, timeout):
+    """
+    runs a command in a process group of its own and returns its exit status, stdout and stderr. If the command
+    times out or the caller is interrupted, the whole group is terminated before the exception propagates.
+    """
+    process = subprocess.Popen(exec_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+    try:
+        output, errors = process.communicate(timeout=timeout)
+    except BaseException:
+        terminate_process_group(process)
+        raise
+    return process.returncode, output, errors
+
+
+def terminate_process_group(process, grace_period=5):
+    # SIGTERM first so McPat can exit cleanly, SIGKILL if it is still running after the grace period
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.communicate(timeout=grace_period)
+    except ProcessLookupError:
+        process.communicate()
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.communicate()
+
+
+async def run_process_group_async(exec_list, timeout):
+    """ run_process_group as an asyncio subprocess, raises asyncio.TimeoutError on timeout """
+    import asyncio
+    process = await asyncio.create_subprocess_exec(*exec_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                                   start_new_session=True)
+    try:
+        output, errors = await asyncio.wait_for(process.communicate(), timeout)
+    except BaseException:
+        await terminate_process_group_async(process)
+        raise
+    return process.returncode, output, errors
+
+
+async def terminate_process_group_async(process, grace_period=5):
+    import asyncio
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        await asyncio.wait_for(process.wait(), grace_period)
+    except ProcessLookupError:
+        await process.wait()
+    except asyncio.TimeoutError:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+
+def exit_status(returncode, errors):
+    # the failure and the error it raises, McPat rejects a configuration by exiting, a signal comes from elsewhere
+    if returncode < 0:
+        failure, error = "was killed by signal %d" % -returncode, McPatInterrupted
+    else:
+        failure, error = "exited with status %d" % returncode, McPatError
+    lines = errors.decode(errors="replace").strip().splitlines()
+    return failure + (": " + lines[-1] if lines else ""), error
+
+
+metric_line = re.compile(r"\s*([^=]*?)\s*=\s*(\S*)")
+
+
+def parse_mcpat_report(output_string):
+    """
+    splits McPat output into its units in a single pass. The report is a list of [title, metrics] in output
+    order, where title is the line naming the unit, indentation included, and metrics maps the names of the
+    lines that follow it, e.g. "Area" or "Runtime Dynamic", to their values.
+    """
+    report = []
+    metrics = None
+    for line in output_string.splitlines():
+        if "=" in line:
+            if metrics is not None:
+                name, value = metric_line.match(line).groups()
+                try:
+                    value = float(value)
+                except ValueError:
+                    pass
+                metrics.setdefault(name, value)
+        elif line.strip() and not line.startswith("*"):
+            metrics = {}
+            report.append([line.rstrip(), metrics])
+    return report
+
+
+def report_tree(report):
+    # nests the units of a report by the indentation of their titles
+    root = {"name": "", "metrics": {}, "units": []}
+    parents = [(-1, root)]
+    for title, metrics in report:
+        indent = len(title) - len(title.lstrip())
+        while parents[-1][0] >= indent:
+            parents.pop()
+        unit = {"name": title.strip().rstrip(":").strip(), "metrics": metrics, "units": []}
+        parents[-1][1]["units"].append(unit)
+        parents.append((indent, unit))
+    return root
+
+
+def find_unit(report, mcpat_pattern):
+    # the first unit whose title matches, then the first Area and Runtime Dynamic reported from there on.
+    # Returns the metrics of the unit reporting the area, and the runtime dynamic power
+    pattern = re.compile(mcpat_pattern)
+    for start, (title, metrics) in enumerate(report):
+        if pattern.search(title + "\n"):
+            break
+    else:
+        return None
+    area_metrics = None
+    for title, metrics in report[start:]:
+        if area_metrics is None and "Area" in metrics:
+            area_metrics = metrics
+        if area_metrics is not None and "Runtime Dynamic" in metrics:
+            return area_metrics, metrics["Runtime Dynamic"]
+    return None
+
+
+def parse_mcpat_output(report, component):
+    """
+    :return energy, area and leakage of the component, energy is the leakage for the static actions
+    """
+    energy = 0
+    area = 0
+    leakage = 0
+    for mcpat_pattern in component.mcpat_patterns:
+        unit = find_unit(report, mcpat_pattern)
+        if unit:
+            area_metrics, runtime_dynamic = unit
+            energy += runtime_dynamic * 10 ** 12 / (int(component.clockrate) * 10 ** 6)  # W to pJ conversion
+            area += area_metrics["Area"]
+            leakage_power = area_metrics.get("Subthreshold Leakage", 0) + area_metrics.get("Gate Leakage", 0)
+            leakage += leakage_power * 10 ** 12 / (int(component.clockrate) * 10 ** 6)  # pJ per cycle
+        else:
+            raise McPatError("Unable to find component " + mcpat_pattern + " in McPat output")
+    return (leakage if component.static else energy), area, leakage
+
+
+def split_core_sections(report):
+    # a heterogeneous system prints one "Core:" section per core, in core order
+    starts = [index for index, (title, metrics) in enumerate(report) if title.strip() == "Core:"]
+    return [report[start:end] for start, end in zip(starts, starts[1:] + [len(report)])]
+
+
+def search_for_scratch_dir():
+    # an explicitly configured directory wins, then tmpfs, then the system temp directory
+    if SCRATCH_DIR:
+        os.makedirs(SCRATCH_DIR, exist_ok=True)
+        return SCRATCH_DIR
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    import tempfile
+    return tempfile.gettempdir()
+
+
+def search_for_mcpat_exec_path(record_dir=None):
+    # the location found last time, as long as the executable has not changed since
+    record_path = os.path.join(record_dir, ".mcpat_exec_path") if record_dir else None
+    if record_path and os.path.exists(record_path):
+        try:
+            with open(record_path, "r") as file:
+                record = json.load(file)
+            if os.access(record["path"], os.X_OK) and os.path.getmtime(record["path"]) == record["mtime"]:
+                return record["path"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    mcpat_exec_path = walk_for_mcpat_exec_path()
+    if mcpat_exec_path and record_path:
+        try:
+            with open(record_path, "w") as file:
+                json.dump({"path": mcpat_exec_path, "mtime": os.path.getmtime(mcpat_exec_path)}, file)
+        except OSError:
+            pass  # the record only saves time, a read-only install works without it
+    return mcpat_exec_path
+
+
+def walk_for_mcpat_exec_path():
     # search the current directory first, top-down walk
     this_dir, this_filename = os.path.split(__file__)
     for root, directories, file_names in os.walk(this_dir):
@@ -207,7 +1033,11 @@ def search_for_mcpat_exec_path():
                     mcpat_exec_path = root + os.sep + file_name
                     return mcpat_exec_path
 
-    # search the PATH variable: search the directories provided in the PATH variable. top-down walk
+    # search the PATH variable: the directories themselves first, then their subdirectories. top-down walk
+    import shutil
+    mcpat_exec_path = shutil.which('mcpat')
+    if mcpat_exec_path:
+        return mcpat_exec_path
     PATH_lst = os.environ['PATH'].split(os.pathsep)
     for path in PATH_lst:
         for root, directories, file_names in os.walk(os.path.abspath(path)):
@@ -217,31 +1047,879 @@ def search_for_mcpat_exec_path():
                     return mcpat_exec_path
 
 
+class InflightLocks:
+    """
+    single-flight for McPat runs: a key is held by one thread of one process at a time, across every process
+    sharing the cache directory. Keys are hashed onto a fixed set of lock files in .inflight, each guarded by
+    a thread lock as well, so threads of one process queue up without opening the lock file.
+    """
+
+    stripes = 256
+
+    def __init__(self, cache_dir):
+        self.lock_dir = os.path.join(cache_dir, ".inflight")
+        self.thread_locks = [threading.Lock() for _ in range(self.stripes)]
+
+    @contextmanager
+    def hold(self, keys):
+        # stripes are always taken in ascending order, so two holders can never wait on each other
+        stripes = sorted({int(key[:8], 16) % self.stripes for key in keys})
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with ExitStack() as stack:
+            for stripe in stripes:
+                stack.enter_context(self.thread_locks[stripe])
+                lock = stack.enter_context(open(os.path.join(self.lock_dir, "%02x.lock" % stripe), "a+"))
+                flock(lock, fcntl.LOCK_EX)
+            yield
+
+
+def flock(file, operation):
+    # flock locks belong to the open file rather than the process, so the kernel does not take several threads
+    # holding locks for one holder waiting on itself. Where flock is emulated with POSIX locks, as on some NFS
+    # mounts, such a false deadlock can still be reported, and the lock is simply asked for again
+    while True:
+        try:
+            fcntl.flock(file, operation)
+            return
+        except OSError as error:
+            if error.errno != errno.EDEADLK:
+                raise
+            time.sleep(0.01)
+
+
+class ComponentMemo:
+    """
+    bounded LRU of the components built for the interfaces Accelergy passes in, with their support verdicts.
+    Accelergy asks whether an action is supported, for its energy and for its area with equal interfaces, so
+    all of those calls share one component and the keys it has hashed. Interfaces are compared by value.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, interface):
+        """ (component, action supported, area supported) of the interface, component is None if it cannot be built """
+        try:
+            key = freeze(interface)
+            hash(key)
+        except TypeError:
+            return self.build(interface)  # an unhashable attribute value, not worth remembering
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+        entry = self.build(copy.deepcopy(interface))  # the caller may go on to modify its dictionary
+        with self.lock:
+            self.entries[key] = entry
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def build(interface):
+        try:
+            component = components[interface['class_name']](interface)
+        except:
+            return None, False, False
+        return component, component.action_supported(), component.attr_supported()
+
+
+class ResultScaling:
+    """
+    results of a component at another clock or technology node, derived from McPat results of otherwise equal
+    hardware that the wrapper has read. Within clock_range of a result's clock, the dynamic energy per access and
+    the area are taken as unchanged, as they are while CACTI picks the same array organization, and leakage energy
+    per cycle scales with the cycle time. Between the two closest technology nodes with results at the clock,
+    energy and area are interpolated linearly in log energy, log area and log node.
+    """
+
+    def __init__(self, clock_range):
+        self.clock_range = clock_range
+        self.samples = {}  # group: {(technology node, clock rate): (energy, area)}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def group(component):
+        """ (group, (technology node, clock rate)) of the component, or None """
+        attributes = {name: value for name, value in component.interface["attributes"].items()
+                      if name not in ("technology", "clockrate")}
+        try:
+            group = (component.interface["class_name"], component.action_name or component.activity_action,
+                     freeze(attributes))
+            hash(group)
+            point = (float(component.tech_node), float(component.clockrate))
+        except (TypeError, ValueError):
+            return None
+        return group, point
+
+    def add(self, component, result):
+        grouped = self.group(component)
+        if grouped is not None:
+            with self.lock:
+                self.samples.setdefault(grouped[0], {})[grouped[1]] = tuple(result)
+
+    def derive(self, component):
+        """ (energy, area, "clock" or "technology") of the component, or None if no results are close enough """
+        grouped = self.group(component)
+        if grouped is None:
+            return None
+        group, (tech_node, clockrate) = grouped
+        with self.lock:
+            samples = dict(self.samples.get(group, {}))
+
+        # the closest result in clock of each technology node, moved to the clock of the component
+        nodes = {}
+        for (node, clock), (energy, area) in samples.items():
+            distance = abs(clock - clockrate) / clockrate
+            if distance <= self.clock_range and (node not in nodes or distance < nodes[node][0]):
+                if component.static:
+                    energy *= clock / clockrate  # leakage power is spent every cycle, a longer cycle leaks more
+                nodes[node] = (distance, energy, area)
+        if tech_node in nodes:
+            return nodes[tech_node][1], nodes[tech_node][2], "clock"
+
+        below = [node for node in nodes if node < tech_node]
+        above = [node for node in nodes if node > tech_node]
+        if not below or not above:
+            return None  # only interpolate between nodes, McPat answers outside them
+        low, high = nodes[max(below)], nodes[min(above)]
+        if min(low[1:] + high[1:]) <= 0:
+            return None
+        weight = (math.log(tech_node) - math.log(max(below))) / (math.log(min(above)) - math.log(max(below)))
+        energy, area = (math.exp((1 - weight) * math.log(a) + weight * math.log(b))
+                        for a, b in zip(low[1:], high[1:]))
+        return energy, area, "technology"
+
+
+class Surrogate:
+    """
+    fast answers for components whose energy and area vary smoothly with one size attribute, such as the size of
+    a cache. Every McPat result the wrapper reads is a sample of its group, the components of the same class and
+    action whose other attributes are all equal. Log energy and log area of a group are fitted by a polynomial in
+    the log size, and a point inside the sampled range is answered from the fit when the largest leave-one-out
+    relative error of the group is below max_error.
+    """
+
+    def __init__(self, max_error, min_samples):
+        self.max_error = max_error
+        self.min_samples = min_samples
+        self.samples = {}  # group: {log size: (energy, area)}
+        self.models = {}   # group: (energy fit, area fit, error, smallest log size, largest log size), or None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def group(component):
+        """ (group, log size) of the component, or None if it has no size to fit on """
+        if component.surrogate_attribute is None:
+            return None
+        attributes = dict(component.interface["attributes"])
+        try:
+            size = math.log(float(attributes.pop(component.surrogate_attribute)))
+            group = (component.interface["class_name"], component.action_name or component.activity_action,
+                     freeze(attributes))
+            hash(group)
+        except (KeyError, TypeError, ValueError):
+            return None
+        return group, size
+
+    def add(self, component, result):
+        grouped = self.group(component)
+        if grouped is None:
+            return
+        group, size = grouped
+        with self.lock:
+            samples = self.samples.setdefault(group, {})
+            if samples.get(size) != tuple(result):
+                samples[size] = tuple(result)
+                self.models.pop(group, None)
+
+    def predict(self, component):
+        """ (energy, area, relative error) of the component from the fit of its group, or None """
+        grouped = self.group(component)
+        if grouped is None:
+            return None
+        group, size = grouped
+        with self.lock:
+            if group not in self.models:
+                self.models[group] = self.fit(dict(self.samples.get(group, {})))
+            model = self.models[group]
+        if model is None or not model[3] <= size <= model[4]:
+            return None  # only interpolate, McPat answers outside the sampled sizes
+        return math.exp(polynomial(model[0], size)), math.exp(polynomial(model[1], size)), model[2]
+
+    def fit(self, samples):
+        if len(samples) < self.min_samples or any(value <= 0 for result in samples.values() for value in result):
+            return None
+        sizes = sorted(samples)
+        degree = 1 if len(sizes) < 5 else 2
+        fits = []
+        error = 0
+        for column in (0, 1):
+            values = [math.log(samples[size][column]) for size in sizes]
+            for i in range(len(sizes)):
+                rest = fit_polynomial(sizes[:i] + sizes[i + 1:], values[:i] + values[i + 1:], degree)
+                if rest is None:
+                    return None
+                error = max(error, abs(math.exp(polynomial(rest, sizes[i]) - values[i]) - 1))
+            fits.append(fit_polynomial(sizes, values, degree))
+        if error > self.max_error or None in fits:
+            return None
+        return fits[0], fits[1], error, sizes[0], sizes[-1]
+
+
+def fit_polynomial(xs, ys, degree):
+    """ least squares coefficients of the polynomial, lowest power first, or None if the points do not determine it """
+    n = degree + 1
+    if len(set(xs)) < n:
+        return None
+    # normal equations, small enough for Gaussian elimination with partial pivoting
+    rows = [[sum(x ** (i + j) for x in xs) for j in range(n)] + [sum(y * x ** i for x, y in zip(xs, ys))]
+            for i in range(n)]
+    for column in range(n):
+        pivot = max(range(column, n), key=lambda row: abs(rows[row][column]))
+        if abs(rows[pivot][column]) < 1e-12:
+            return None
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(n):
+            if row != column:
+                factor = rows[row][column] / rows[column][column]
+                rows[row] = [a - factor * b for a, b in zip(rows[row], rows[column])]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+
+def polynomial(coefficients, x):
+    return sum(coefficient * x ** power for power, coefficient in enumerate(coefficients))
+
+
+def freeze(value):
+    # a hashable value equal for equal interfaces, whatever the order of their keys
+    if isinstance(value, dict):
+        try:
+            return frozenset(value.items())  # attributes are usually flat
+        except TypeError:
+            return frozenset((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class JsonCache:
+    """
+    the original cache format, one JSON entry per line in .cache, loaded completely into memory
+    """
+
+    def __init__(self, cache_dir):
+        self.results = None
+        self.areas = None  # (area, leakage) by component area_key, independent of the action
+        self.classes = None  # class name: {key: interface of the result}
+        self.reports = None  # McPat report by component input_key
+        self.failures = None  # error text by the input_key of a configuration McPat failed on
+        self.cache_file = os.path.join(cache_dir, ".cache")
+        self.reports_file = os.path.join(cache_dir, ".cache.reports")
+        self.failures_file = os.path.join(cache_dir, ".cache.failures")
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load_entries(path, time_index, timeout_days=CACHE_TIMEOUT):
+        # the entries of a file that have not timed out, the file is rewritten without the others
+        entries = []
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                for line in file.readlines():
+                    entry = json.loads(line)
+                    if not isinstance(entry[0], str):
+                        continue  # entry from before the content addressed keys, which can never be hit again
+                    entry_time = entry[time_index]
+                    current_time = time.time()
+                    timeout = timeout_days * 86400
+                    if current_time > entry_time > current_time - timeout:
+                        entries.append(entry)
+            with open(path, "w") as file:
+                for entry in entries:
+                    json.dump(entry, file)
+                    file.write("\n")
+        return entries
+
+    def load(self):
+        # the file is read on the first lookup rather than when the wrapper is built
+        self.results = {}
+        self.areas = {}
+        self.classes = {}
+        for entry in self.load_entries(self.cache_file, 3):
+            self.results[entry[0]] = (entry[1], entry[2])
+            if len(entry) > 4 and entry[4] is not None:
+                self.areas[entry[4]] = (entry[2], entry[5] if len(entry) > 5 else None)
+            if len(entry) > 6 and entry[6] is not None:
+                self.classes.setdefault(entry[6]["class_name"], {})[entry[0]] = entry[6]
+
+    def append(self, path, entry):
+        with self.lock, open(path, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+
+    def get(self, key):
+        if self.results is None:
+            self.load()
+        return self.results.get(key)
+
+    def get_area(self, area_key):
+        if self.areas is None:
+            self.load()
+        return self.areas.get(area_key, (None, None))[0]
+
+    def get_leakage(self, area_key):
+        if self.areas is None:
+            self.load()
+        return self.areas.get(area_key, (None, None))[1]
+
+    def get_class_results(self, class_name):
+        """ (key, interface, (energy, area)) of every result stored with an interface of the class """
+        if self.classes is None:
+            self.load()
+        return [(key, interface, self.results[key]) for key, interface in self.classes.get(class_name, {}).items()]
+
+    def put(self, key, energy, area, area_key=None, leakage=None, interface=None):
+        if self.results is None:
+            self.load()
+        self.results[key] = (energy, area)
+        entry = [key, energy, area, time.time()]
+        if area_key is not None:
+            self.areas[area_key] = (area, leakage)
+        if area_key is not None or interface is not None:
+            entry += [area_key, leakage]
+        if interface is not None:
+            self.classes.setdefault(interface["class_name"], {})[key] = interface
+            entry.append(interface)
+        self.append(self.cache_file, entry)
+
+    def get_report(self, input_key):
+        if self.reports is None:
+            self.reports = {entry[0]: entry[2] for entry in self.load_entries(self.reports_file, 1)}
+        return self.reports.get(input_key)
+
+    def put_report(self, input_key, report):
+        if self.reports is None:
+            self.get_report(input_key)
+        self.reports[input_key] = report
+        self.append(self.reports_file, [input_key, time.time(), report])
+
+    def get_failure(self, input_key):
+        if self.failures is None:
+            self.failures = {entry[0]: (entry[2], entry[1])
+                             for entry in self.load_entries(self.failures_file, 1, FAILURE_TIMEOUT)}
+        failure = self.failures.get(input_key)
+        if failure is None or failure[1] < time.time() - FAILURE_TIMEOUT * 86400:
+            return None
+        return failure[0]
+
+    def put_failure(self, input_key, error):
+        if self.failures is None:
+            self.get_failure(input_key)
+        entry_time = time.time()
+        self.failures[input_key] = (error, entry_time)
+        self.append(self.failures_file, [input_key, entry_time, error])
+
+
+class SqliteCache:
+    """
+    indexed cache in .cache.sqlite, entries are looked up one at a time and never loaded as a whole.
+    SQLite's locking makes it safe for several processes to read and write the same file. Entries that
+    were looked up are kept in memory, so memory follows the working set rather than the whole history.
+    """
+
+    expire_batch = 1000  # entries removed per expiry pass, keeps opening the cache cheap
+
+    def __init__(self, cache_dir):
+        self.cache_file = os.path.join(cache_dir, ".cache.sqlite")
+        self.lock = threading.Lock()
+        self.results = {}
+        self.areas = {}
+        import sqlite3
+        is_new = not os.path.exists(self.cache_file)
+        self.connection = sqlite3.connect(self.cache_file, timeout=60, check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, energy REAL, "
+                                "area REAL, time REAL, area_key TEXT, leakage REAL, class_name TEXT, "
+                                "interface TEXT)")
+        # the columns added since the table was first created. Other processes may open an old cache at the same
+        # time, so the check and the change happen in one write transaction
+        self.connection.execute("BEGIN IMMEDIATE")
+        with self.connection:
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(results)")]
+            for column, column_type in (("leakage", "REAL"), ("class_name", "TEXT"), ("interface", "TEXT")):
+                if column not in columns:
+                    self.connection.execute("ALTER TABLE results ADD COLUMN %s %s" % (column, column_type))
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_area_key ON results (area_key)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_class_name ON results (class_name)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_time ON results (time)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS reports (input_key TEXT PRIMARY KEY, report TEXT, "
+                                "time REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS reports_time ON reports (time)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS failures (input_key TEXT PRIMARY KEY, error TEXT, "
+                                "time REAL)")
+        if is_new:
+            self.import_json(os.path.join(cache_dir, ".cache"))
+        self.expire()
+
+    def cutoff(self, timeout_days=CACHE_TIMEOUT):
+        return time.time() - timeout_days * 86400
+
+    def expire(self):
+        with self.lock:
+            for table, timeout_days in (("results", CACHE_TIMEOUT), ("reports", CACHE_TIMEOUT),
+                                        ("failures", FAILURE_TIMEOUT)):
+                self.connection.execute("DELETE FROM %s WHERE rowid IN "
+                                        "(SELECT rowid FROM %s WHERE time < ? LIMIT ?)" % (table, table),
+                                        (self.cutoff(timeout_days), self.expire_batch))
+
+    def import_json(self, json_file):
+        # carry over the results of the plain .cache file the first time the store is created
+        if not os.path.exists(json_file):
+            return
+        rows = []
+        with open(json_file, "r") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry[0], str):
+                    entry = (entry + [None, None, None])[:7]
+                    interface = entry.pop()
+                    entry += [interface["class_name"], json.dumps(interface)] if interface else [None, None]
+                    rows.append(entry)
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO results (key, energy, area, time, area_key, leakage, "
+                                        "class_name, interface) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def get(self, key):
+        if key in self.results:
+            return self.results[key]
+        with self.lock:
+            row = self.connection.execute("SELECT energy, area FROM results WHERE key = ? AND time >= ?",
+                                          (key, self.cutoff())).fetchone()
+        if row is None:
+            return None  # misses are not remembered, another process may add the entry
+        self.results[key] = tuple(row)
+        return self.results[key]
+
+    def get_static(self, area_key):
+        # (area, leakage) of the hardware, preferring a row that knows the leakage
+        if area_key in self.areas:
+            return self.areas[area_key]
+        with self.lock:
+            row = self.connection.execute("SELECT area, leakage FROM results WHERE area_key = ? AND time >= ? "
+                                          "ORDER BY leakage IS NULL LIMIT 1",
+                                          (area_key, self.cutoff())).fetchone()
+        if row is None:
+            return None, None
+        if row[1] is not None:
+            self.areas[area_key] = tuple(row)
+        return tuple(row)
+
+    def get_area(self, area_key):
+        return self.get_static(area_key)[0]
+
+    def get_leakage(self, area_key):
+        return self.get_static(area_key)[1]
+
+    def get_class_results(self, class_name):
+        """ (key, interface, (energy, area)) of every result stored with an interface of the class """
+        with self.lock:
+            rows = self.connection.execute("SELECT key, interface, energy, area FROM results "
+                                           "WHERE class_name = ? AND time >= ?", (class_name, self.cutoff())).fetchall()
+        return [(key, json.loads(interface), (energy, area)) for key, interface, energy, area in rows]
+
+    def put(self, key, energy, area, area_key=None, leakage=None, interface=None):
+        self.results[key] = (energy, area)
+        if area_key is not None and leakage is not None:
+            self.areas[area_key] = (area, leakage)
+        description = (interface["class_name"], json.dumps(interface)) if interface is not None else (None, None)
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO results (key, energy, area, time, area_key, leakage, "
+                                    "class_name, interface) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (key, energy, area, time.time(), area_key, leakage, *description))
+
+    def get_report(self, input_key):
+        # reports are large and rarely reused, so they are not kept in memory
+        with self.lock:
+            row = self.connection.execute("SELECT report FROM reports WHERE input_key = ? AND time >= ?",
+                                          (input_key, self.cutoff())).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put_report(self, input_key, report):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO reports VALUES (?, ?, ?)",
+                                    (input_key, json.dumps(report), time.time()))
+
+    def get_failure(self, input_key):
+        with self.lock:
+            row = self.connection.execute("SELECT error FROM failures WHERE input_key = ? AND time >= ?",
+                                          (input_key, self.cutoff(FAILURE_TIMEOUT))).fetchone()
+        return row[0] if row is not None else None
+
+    def put_failure(self, input_key, error):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO failures VALUES (?, ?, ?)",
+                                    (input_key, error, time.time()))
+
+
+class SharedCache:
+    """
+    cache for a directory shared by many processes or hosts, e.g. over NFS. Every entry is appended to
+    .cache.journal as one checksummed line while holding a file lock on .cache.lock, so writers never
+    interleave, and a line torn by a crashed writer fails its checksum and is skipped. Each process reads
+    only the part of the journal it has not seen yet. Once most lines are expired, torn or superseded, the
+    journal is rewritten into a temporary file that atomically replaces it. McPat reports are too large to
+    be read by every process, each one is a file in .reports named after its input key, written to a
+    temporary file that atomically replaces it and read only when asked for.
+    """
+
+    compact_threshold = 1000  # stale lines tolerated before the journal is compacted
+
+    def __init__(self, cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_file = os.path.join(cache_dir, ".cache.journal")
+        self.lock_file = os.path.join(cache_dir, ".cache.lock")
+        self.reports_dir = os.path.join(cache_dir, ".reports")
+        self.lock = threading.Lock()  # orders the threads, and guards the entries read so far
+        self.results = {}
+        self.areas = {}
+        self.failures = {}
+        self.offset = 0   # how much of the journal has been read
+        self.inode = None
+        self.stale = 0    # lines read that are expired, torn or superseded
+
+    @contextmanager
+    def file_lock(self, exclusive):
+        # only ever hold one of these at a time, a second open of the lock file would wait on the first
+        with open(self.lock_file, "a+") as lock:
+            flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def encode(entry):
+        payload = json.dumps(entry)
+        return ("%08x %s\n" % (zlib.crc32(payload.encode()), payload)).encode()
+
+    @staticmethod
+    def decode(line):
+        try:
+            checksum, payload = line.decode().split(" ", 1)
+            if int(checksum, 16) != zlib.crc32(payload.encode()):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def read_journal(self):
+        # reads the lines appended since the last call, the caller holds the file lock
+        try:
+            stat = os.stat(self.cache_file)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self.inode or stat.st_size < self.offset:
+            # the journal is new or was replaced by a compaction, start over
+            self.results, self.areas, self.failures, self.offset, self.stale = {}, {}, {}, 0, 0
+            self.inode = stat.st_ino if stat is not None else None
+        if stat is None or stat.st_size == self.offset:
+            return
+        with open(self.cache_file, "rb") as file:
+            file.seek(self.offset)
+            data = file.read()
+        end = data.rfind(b"\n") + 1  # a line without its newline is still being written, or torn
+        cutoff = time.time() - CACHE_TIMEOUT * 86400
+        failure_cutoff = time.time() - FAILURE_TIMEOUT * 86400
+        for line in data[:end].splitlines():
+            entry = self.decode(line)
+            # failures are the entries written as objects, reports journaled by earlier versions are dropped
+            if isinstance(entry, dict) and "failure" in entry and entry["time"] >= failure_cutoff:
+                self.stale += entry["failure"] in self.failures
+                self.failures[entry["failure"]] = entry
+                continue
+            if entry is None or isinstance(entry, dict) or entry[3] < cutoff:
+                self.stale += 1
+                continue
+            if entry[0] in self.results:
+                self.stale += 1
+            entry = (entry + [None, None])[:7]
+            self.results[entry[0]] = tuple(entry[1:])
+            if entry[4] is not None:
+                self.areas[entry[4]] = (entry[2], entry[3], entry[5])
+        self.offset += end
+
+    def refresh(self):
+        with self.lock:
+            with self.file_lock(exclusive=False):
+                self.read_journal()
+            if self.stale > max(self.compact_threshold, len(self.results) + len(self.failures)):
+                self.compact()
+
+    def compact(self):
+        # the caller holds self.lock
+        with self.file_lock(exclusive=True):
+            self.read_journal()
+            temp_file = "%s.%d.tmp" % (self.cache_file, os.getpid())
+            with open(temp_file, "wb") as file:
+                for key, result in self.results.items():
+                    file.write(self.encode([key, *result]))
+                for entry in self.failures.values():
+                    file.write(self.encode(entry))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_file, self.cache_file)
+            stat = os.stat(self.cache_file)
+            self.inode, self.offset, self.stale = stat.st_ino, stat.st_size, 0
+
+    def get(self, key):
+        if key not in self.results:
+            self.refresh()
+        result = self.results.get(key)
+        if result is None or result[2] < time.time() - CACHE_TIMEOUT * 86400:
+            return None
+        return result[0], result[1]
+
+    def get_static(self, area_key):
+        if area_key not in self.areas:
+            self.refresh()
+        result = self.areas.get(area_key)
+        if result is None or result[1] < time.time() - CACHE_TIMEOUT * 86400:
+            return None, None
+        return result[0], result[2]
+
+    def get_area(self, area_key):
+        return self.get_static(area_key)[0]
+
+    def get_leakage(self, area_key):
+        return self.get_static(area_key)[1]
+
+    def append(self, entry):
+        # the caller holds self.lock
+        line = self.encode(entry)
+        with self.file_lock(exclusive=True):
+            self.read_journal()
+            with open(self.cache_file, "ab+") as file:
+                file.seek(0, os.SEEK_END)
+                if file.tell() > 0:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b"\n":
+                        line = b"\n" + line  # terminate a line torn by a crashed writer
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+                if self.inode is None:
+                    self.inode = os.fstat(file.fileno()).st_ino
+                self.offset = file.tell()
+
+    def get_class_results(self, class_name):
+        """ (key, interface, (energy, area)) of every result stored with an interface of the class """
+        self.refresh()
+        cutoff = time.time() - CACHE_TIMEOUT * 86400
+        with self.lock:
+            return [(key, result[5], (result[0], result[1])) for key, result in self.results.items()
+                    if result[5] is not None and result[5]["class_name"] == class_name and result[2] >= cutoff]
+
+    def put(self, key, energy, area, area_key=None, leakage=None, interface=None):
+        entry_time = time.time()
+        with self.lock:
+            self.append([key, energy, area, entry_time, area_key, leakage, interface])
+            if key in self.results:
+                self.stale += 1
+            self.results[key] = (energy, area, entry_time, area_key, leakage, interface)
+            if area_key is not None:
+                self.areas[area_key] = (area, entry_time, leakage)
+
+    def get_report(self, input_key):
+        report_file = os.path.join(self.reports_dir, input_key)
+        try:
+            if os.stat(report_file).st_mtime < time.time() - CACHE_TIMEOUT * 86400:
+                os.remove(report_file)
+                return None
+            with open(report_file) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put_report(self, input_key, report):
+        # readers see either the old report or the new one, never a partly written file
+        os.makedirs(self.reports_dir, exist_ok=True)
+        report_file = os.path.join(self.reports_dir, input_key)
+        temp_file = "%s.%d.%d.tmp" % (report_file, os.getpid(), threading.get_ident())
+        with open(temp_file, "w") as file:
+            json.dump(report, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, report_file)
+
+    def get_failure(self, input_key):
+        if input_key not in self.failures:
+            self.refresh()
+        entry = self.failures.get(input_key)
+        if entry is None or entry["time"] < time.time() - FAILURE_TIMEOUT * 86400:
+            return None
+        return entry["error"]
+
+    def put_failure(self, input_key, error):
+        entry = {"failure": input_key, "error": error, "time": time.time()}
+        with self.lock:
+            self.append(entry)
+            if input_key in self.failures:
+                self.stale += 1
+            self.failures[input_key] = entry
+
+
+cache_backends = {
+    "json": JsonCache,
+    "sqlite": SqliteCache,
+    "shared": SharedCache,
+}
+
+
 class Properties:
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    tree_template = ET.parse(os.path.join(dir_path, "properties.xml"))
+    """
+    a McPat input file. properties.xml is split once at every value attribute into fixed text and slots,
+    so an input file is rendered by filling in the changed slots and joining the text, rather than by
+    copying and searching the whole tree for every query.
+    """
 
-    def __init__(self):
-        self.tree = copy.deepcopy(self.tree_template)
-        self.root = self.tree.getroot()
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    tree_template = None  # parsed on the first McPat query, cached results and support checks never need it
+    template_lock = threading.RLock()
+    template_hash = None
+    tokenized_templates = {}  # (text parts, slot by dotted path) by number of cores
+
+    @classmethod
+    def template(cls):
+        with cls.template_lock:
+            if cls.tree_template is None:
+                import xml.etree.ElementTree as ET
+                cls.tree_template = ET.parse(os.path.join(cls.dir_path, "properties.xml"))
+            return cls.tree_template
+
+    @classmethod
+    def template_digest(cls):
+        # results are only comparable if they were computed from the same template
+        if cls.template_hash is None:
+            import hashlib
+            with open(os.path.join(cls.dir_path, "properties.xml"), "rb") as file:
+                cls.template_hash = hashlib.sha1(file.read()).hexdigest()
+        return cls.template_hash
+
+    @classmethod
+    def tokenized(cls, number_of_cores):
+        with cls.template_lock:
+            if number_of_cores not in cls.tokenized_templates:
+                cls.tokenized_templates[number_of_cores] = cls.tokenize(number_of_cores)
+            return cls.tokenized_templates[number_of_cores]
+
+    @classmethod
+    def tokenize(cls, number_of_cores):
+        tree = copy.deepcopy(cls.template())
+        if number_of_cores > 1:
+            add_cores(tree.getroot(), number_of_cores)
+
+        # number every value in document order, the number of the first node of a path is its slot
+        defaults = []
+        slots = {}
+        pending = [(child, None) for child in reversed(tree.getroot())]
+        while pending:
+            node, parent_path = pending.pop()
+            if "name" not in node.attrib:
+                continue
+            path = node.attrib["name"] if parent_path is None else parent_path + "." + node.attrib["name"]
+            if "value" in node.attrib:
+                slots.setdefault(path, len(defaults))
+                defaults.append(escape_attribute(node.attrib["value"]))
+                node.attrib["value"] = "@@%d@@" % (len(defaults) - 1)
+            pending.extend((child, path) for child in reversed(node))
+
+        output = io.BytesIO()
+        tree.write(output, encoding="utf8")
+        parts = re.split(r"@@(\d+)@@", output.getvalue().decode("utf8"))
+        for slot, default in enumerate(defaults):
+            assert parts[2 * slot + 1] == str(slot)
+            parts[2 * slot + 1] = default
+        return parts, slots
+
+    def __init__(self, number_of_cores=1):
+        self.parts, self.slots = self.tokenized(number_of_cores)
+        self.values = {}
 
     def replace(self, path, value):
-        query = "."
-        for name in path.split("."):
-            query += "/*[@name='%s']" % name
-        node = self.root.find(query)
-        if node is not None:
-            node.attrib["value"] = str(value)
+        slot = self.slots.get(path)
+        if slot is not None:
+            self.values[slot] = escape_attribute(str(value))
             return True
         else:
             return False
 
+    def update(self, properties):
+        for path, value in properties.items():
+            if not self.replace(path, value):
+                raise Exception("Could not locate property %s" % path)
+
+    def render(self):
+        parts = list(self.parts)
+        for slot, value in self.values.items():
+            parts[2 * slot + 1] = value
+        return "".join(parts)
+
     def write(self, path):
-        self.tree.write(path, encoding="utf8")
+        with open(path, "w", encoding="utf8") as file:
+            file.write(self.render())
+
+
+def add_cores(root, number_of_cores):
+    # clone core0 into core1 .. core<number_of_cores - 1>, placed right after it
+    system = root.find("./*[@name='system']")
+    core = system.find("./*[@name='core0']")
+    position = list(system).index(core)
+    for core_index in range(1, number_of_cores):
+        clone = copy.deepcopy(core)
+        clone.attrib["name"] = "core%d" % core_index
+        for node in clone.iter():
+            if "id" in node.attrib:
+                node.attrib["id"] = node.attrib["id"].replace("system.core0", "system.core%d" % core_index, 1)
+        system.insert(position + core_index, clone)
+
+
+def escape_attribute(value):
+    # the escaping ElementTree applies to attribute values
+    for character, entity in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"),
+                              ("\r", "&#13;"), ("\n", "&#10;"), ("\t", "&#09;")):
+        value = value.replace(character, entity)
+    return value
+
+
+def normalize_value(value):
+    # McPat reads every value as text, so 45, 45.0 and "45" are the same input
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def content_key(properties, mcpat_patterns):
+    """ hash of the properties as they appear in the McPat input file, together with the output patterns """
+    import hashlib
+    items = sorted((path, normalize_value(value)) for path, value in properties.items())
+    digest = hashlib.sha1(Properties.template_digest().encode())
+    digest.update(json.dumps([items, mcpat_patterns]).encode())
+    return digest.hexdigest()
 
 
 class McPatComponent:
 
+    actions = []       # every action the component class can be queried for, besides the static ones
+    static_actions = ["idle", "leakage"]  # leakage energy per cycle, independent of the activity
+    core_local = True  # McPat reports the component inside the core section of its output
+    surrogate_attribute = None  # the size attribute the energy and area of the component vary smoothly with
+
     base_properties = {
         "system.number_of_cores": 1,
         "system.number_of_L1Directories": 1,
@@ -249,10 +1927,32 @@ class McPatComponent:
         "system.number_of_L2s": 1,
         "system.Embedded": 0,
     }
+    # the smallest system McPat can evaluate, a single core without L2, directories or NoC, used with MINIMAL_SYSTEM.
+    # Component classes turn on the units they need, so a query does not pay for CACTI to optimize arrays it never
+    # reports. The system is part of the cache keys, so switching invalidates the cached results
+    minimal_properties = {
+        "system.number_of_cores": 1,
+        "system.number_of_L1Directories": 0,
+        "system.number_of_L2Directories": 0,
+        "system.number_of_L2s": 0,
+        "system.Private_L2": 0,
+        "system.number_of_NoCs": 0,
+        "system.Embedded": 0,
+    }
 
     def __init__(self, interface):
         self.interface = interface
-        self.properties = self.base_properties.copy()
+        self.action_name = interface.get("action_name")  # area interfaces have no action
+        # a static action is evaluated from the McPat input of the first dynamic action, whose run reports the leakage.
+        # So is an area interface, its area comes from the same run
+        self.static = self.action_name in self.static_actions
+        self.activity_action = self.actions[0] if self.static or self.action_name is None else self.action_name
+        # McPat params, which describe the hardware
+        self.properties = (self.minimal_properties if MINIMAL_SYSTEM else self.base_properties).copy()
+        self.stats = {}                                   # McPat stats, which describe the activity
+        self._key = None
+        self._input_key = None
+        self._area_key = None
 
         tech_node = interface['attributes']['technology']  # technology in nm
         if type(tech_node) == str:
@@ -266,10 +1966,10 @@ class McPatComponent:
         self.properties["system.target_core_clockrate"] = clockrate
         self.properties["system.core0.clock_rate"] = clockrate
         self.clockrate = clockrate
-        self.properties["system.total_cycles"] = MUL_FACTOR
-        self.properties["system.core0.total_cycles"] = MUL_FACTOR
-        self.properties["system.busy_cycles"] = MUL_FACTOR
-        self.properties["system.core0.busy_cycles"] = MUL_FACTOR
+        self.stats["system.total_cycles"] = MUL_FACTOR
+        self.stats["system.core0.total_cycles"] = MUL_FACTOR
+        self.stats["system.busy_cycles"] = MUL_FACTOR
+        self.stats["system.core0.busy_cycles"] = MUL_FACTOR
 
         datawidth = interface["attributes"]["datawidth"]
         self.properties["system.machine_bits"] = datawidth
@@ -287,39 +1987,105 @@ class McPatComponent:
 
         self.global_attrs = (tech_node, clockrate, datawidth, device_type)
 
+    def identifier(self):
+        identifier = self.interface["class_name"]
+        if "type" in self.interface["attributes"]:
+            identifier += " " + self.interface["attributes"]["type"]
+        return identifier + " " + (self.action_name or "area")
+
+    def description(self):
+        """ the interface the result of the component is stored with, None if it cannot be written as JSON """
+        interface = {"class_name": self.interface["class_name"], "attributes": self.interface["attributes"],
+                     "action_name": self.action_name}
+        try:
+            json.dumps(interface)
+        except (TypeError, ValueError):
+            return None
+        return interface
+
+    def run_name(self):
+        # names the McPat run in scratch directories and messages
+        return "%s-%s" % (self.name, self.action_name or self.activity_action)
+
+    def sibling_components(self):
+        """ the same component for each of its other supported actions """
+        siblings = []
+        for action_name in self.actions + self.static_actions:
+            if action_name != self.action_name:
+                sibling = type(self)(dict(self.interface, action_name=action_name))
+                if sibling.action_supported():
+                    siblings.append(sibling)
+        return siblings
+
+    def all_properties(self):
+        return {**self.properties, **self.stats}
+
+    @property
+    def key(self):
+        """ hash of the McPat input and the output patterns, components with equal keys have equal results """
+        if self._key is None:
+            if self.static:
+                self._key = content_key(self.properties, self.mcpat_patterns + ["leakage"])
+            else:
+                self._key = content_key(self.all_properties(), self.mcpat_patterns)
+        return self._key
+
+    def input_key(self):
+        """ hash of the McPat input alone, components with equal input keys share one McPat report """
+        if self._input_key is None:
+            self._input_key = content_key(self.all_properties(), None)
+        return self._input_key
+
+    def area_key(self):
+        """ identifies the hardware regardless of its activity, components with equal area keys have equal areas """
+        if self._area_key is None:
+            self._area_key = content_key(self.properties, self.mcpat_patterns)
+        return self._area_key
+
+    def system_key(self):
+        """ the properties outside of core0, components with equal system keys can share one McPat run """
+        return tuple(sorted((path, str(value)) for path, value in self.all_properties().items()
+                            if not path.startswith("system.core0.")))
+
+    def core_properties(self, core_index):
+        """ the core0 properties of the component, moved to core<core_index> """
+        return {path.replace("system.core0.", "system.core%d." % core_index, 1): value
+                for path, value in self.all_properties().items() if path.startswith("system.core0.")}
+
 
 class McPatFuncUnit(McPatComponent):
 
+    actions = ["access"]
+
     def __init__(self, interface):
         super().__init__(interface)
         self.type = interface["attributes"]["type"]
-        action_name = interface["action_name"]
-        if action_name == "access":
-            action_count = MUL_FACTOR
-        elif action_name == "idle":
-            action_count = 0
+        action_count = MUL_FACTOR
 
         self.name = "func_unit"
-        self.key = ("func_unit", self.type, action_name, *self.global_attrs)
         if self.type == "fpu":
-            self.properties["system.core0.fpu_accesses"] = action_count
+            self.stats["system.core0.fpu_accesses"] = action_count
             self.mcpat_patterns = ["Floating Point Units"]
         elif self.type == "int_alu":
-            self.properties["system.core0.ialu_accesses"] = action_count
+            self.stats["system.core0.ialu_accesses"] = action_count
             self.mcpat_patterns = ["Integer ALUs"]
         else:
-            self.properties["system.core0.mul_accesses"] = action_count
+            self.stats["system.core0.mul_accesses"] = action_count
             self.mcpat_patterns = ["Complex ALUs"]
 
     def attr_supported(self):
         return self.type in ["fpu", "int_alu", "mul_alu"]
 
     def action_supported(self):
-        return self.attr_supported() and self.interface["action_name"] in ["access", "idle"]
+        return self.attr_supported() and self.action_name in self.actions + self.static_actions
 
 
 class McPatXBar(McPatComponent):
 
+    actions = ["access"]
+    # McPat sizes the NoC links from the area of the units they connect, so the L2 and directories stay in the system
+    minimal_properties = McPatComponent.base_properties
+
     def __init__(self, interface):
         super().__init__(interface)
         horizontal_nodes = interface["attributes"]["horizontal_nodes"]
@@ -334,22 +2100,24 @@ class McPatXBar(McPatComponent):
         self.properties["system.noc0.link_throughput"] = throughput
         self.properties["system.noc0.link_latency"] = latency
         self.properties["system.noc0.flit_bits"] = flit_bits
-        self.properties["system.noc0.total_accesses"] = MUL_FACTOR
+        self.stats["system.noc0.total_accesses"] = MUL_FACTOR
 
         self.name = "xbar"
-        self.key = ("xbar", *self.global_attrs, horizontal_nodes,
-                    vertical_nodes, throughput, latency, flit_bits)
         self.mcpat_patterns = ["Total NoCs"]
+        self.core_local = False
 
     def attr_supported(self):
         return True
 
     def action_supported(self):
-        return self.interface["action_name"] == "access"
+        return self.action_name in self.actions + self.static_actions
 
 
 class McPatCache(McPatComponent):
 
+    actions = ["read_hit", "read_miss", "write_hit", "write_miss"]
+    surrogate_attribute = "size"
+
     def __init__(self, interface):
         super().__init__(interface)
         size = interface["attributes"]["size"]                            # size in bytes
@@ -360,7 +2128,7 @@ class McPatCache(McPatComponent):
         write_buffer_size = interface["attributes"]["write_buffer_size"]  # write buffer size
         n_banks = interface["attributes"]["n_banks"]                      # number of cache banks
 
-        action_name = interface["action_name"]
+        action_name = self.activity_action
         read_access, read_misses, write_access, write_miss = 0, 0, 0, 0
         if action_name == "read_hit":
             read_access = MUL_FACTOR
@@ -379,16 +2147,20 @@ class McPatCache(McPatComponent):
         elif cache_type == "dcache":
             mcpat_path = "system.core0.dcache"
             mcpat_config_path = "system.core0.dcache.dcache_config"
-            self.properties["%s.write_accesses" % mcpat_path] = write_access
-            self.properties["%s.write_misses" % mcpat_path] = write_miss
+            self.stats["%s.write_accesses" % mcpat_path] = write_access
+            self.stats["%s.write_misses" % mcpat_path] = write_miss
             self.mcpat_patterns = ["Data Cache"]
         else:
             mcpat_path = "system.L20"
             mcpat_config_path = "system.L20.L2_config"
-            self.properties["%s.write_accesses" % mcpat_path] = write_access
-            self.properties["%s.write_misses" % mcpat_path] = write_miss
+            self.stats["%s.write_accesses" % mcpat_path] = write_access
+            self.stats["%s.write_misses" % mcpat_path] = write_miss
             self.properties["%s.clockrate" % mcpat_path] = self.clockrate
+            if MINIMAL_SYSTEM:
+                self.properties["system.number_of_L2s"] = 1
+                self.properties["system.Private_L2"] = 1
             self.mcpat_patterns = ["L2\n"]
+            self.core_local = False
 
         config_string = "%s, %s, %s, %s, 1, %s, %s, 0" % \
                         (size, block_size, associativity, n_banks, data_latency, self.datawidth)
@@ -396,13 +2168,11 @@ class McPatCache(McPatComponent):
 
         self.properties[mcpat_config_path] = config_string
         self.properties["%s.buffer_sizes" % mcpat_path] = buffer_string
-        self.properties["%s.read_accesses" % mcpat_path] = read_access
-        self.properties["%s.read_misses" % mcpat_path] = read_misses
-        self.properties["%s.conflicts" % mcpat_path] = 0
+        self.stats["%s.read_accesses" % mcpat_path] = read_access
+        self.stats["%s.read_misses" % mcpat_path] = read_misses
+        self.stats["%s.conflicts" % mcpat_path] = 0
 
         self.name = "cache"
-        self.key = ("cache", cache_type, action_name, *self.global_attrs, size, block_size,
-                    associativity, data_latency, mshr_size, write_buffer_size, n_banks)
 
     def attr_supported(self):
         return self.interface["attributes"]["cache_type"] in ["icache", "dcache", "l2cache"]
@@ -410,15 +2180,17 @@ class McPatCache(McPatComponent):
     def action_supported(self):
         cache_type = self.interface["attributes"]["cache_type"]
         if cache_type == "icache":
-            return self.interface["action_name"] in ["read_hit", "read_miss"]
+            return self.action_name in ["read_hit", "read_miss"] + self.static_actions
         elif cache_type in ["dcache", "l2cache"]:
-            return self.interface["action_name"] in ["read_hit", "read_miss", "write_hit", "write_miss"]
+            return self.action_name in self.actions + self.static_actions
         else:
             return False
 
 
 class McPatTournamentBP(McPatComponent):
 
+    actions = ["hit", "miss"]
+
     def __init__(self, interface):
         super().__init__(interface)
         local_entries = interface["attributes"]["local_pred_entries"]
@@ -436,36 +2208,37 @@ class McPatTournamentBP(McPatComponent):
         self.properties[base + "chooser_predictor_bits"] = choice_bits
         self.properties[base + "chooser_predictor_entries"] = choice_entries
 
-        action_name = interface["action_name"]
+        action_name = self.activity_action
         if action_name == "hit":
             bp_access, bp_miss = MUL_FACTOR, 0
         elif action_name == "miss":
             bp_access, bp_miss = MUL_FACTOR, MUL_FACTOR
 
-        self.properties["system.core0.branch_instructions"] = bp_access
-        self.properties["system.core0.branch_mispredictions"] = bp_miss
+        self.stats["system.core0.branch_instructions"] = bp_access
+        self.stats["system.core0.branch_mispredictions"] = bp_miss
 
         self.name = "tournament_bp"
-        self.key = ("tournament_bp", action_name, *self.global_attrs, local_entries,
-                    local_bits, global_entries, global_bits, choice_entries, choice_bits)
         self.mcpat_patterns = ["Branch Predictor"]
 
     def attr_supported(self):
         return True
 
     def action_supported(self):
-        return self.interface["action_name"] in ["hit", "miss"]
+        return self.action_name in self.actions + self.static_actions
 
 
 class McPatBTB(McPatComponent):
 
+    actions = ["read", "write"]
+    surrogate_attribute = "entries"
+
     def __init__(self, interface):
         super().__init__(interface)
         entries = interface["attributes"]["entries"]
         block_width = interface["attributes"]["block_width"]
         associativity = interface["attributes"]["associativity"]
         banks = interface["attributes"]["banks"]
-        action_name = interface["action_name"]
+        action_name = self.activity_action
         if action_name == "read":
             read, write = MUL_FACTOR, 0
         elif action_name == "write":
@@ -474,27 +2247,28 @@ class McPatBTB(McPatComponent):
         config_string = "%s, %s, %s, %s, 1, 1" % (entries, block_width, associativity, banks)
 
         self.properties["system.core0.BTB.BTB_config"] = config_string
-        self.properties["system.core0.BTB.read_accesses"] = read
-        self.properties["system.core0.BTB.write_accesses"] = write
+        self.stats["system.core0.BTB.read_accesses"] = read
+        self.stats["system.core0.BTB.write_accesses"] = write
         self.mcpat_patterns = ["Branch Target Buffer"]
 
         self.name = "btb"
-        self.key = ("btb", action_name, *self.global_attrs, entries, block_width, associativity, banks)
 
     def attr_supported(self):
         return True
 
     def action_supported(self):
-        return self.interface["action_name"] in ["read", "write"]
+        return self.action_name in self.actions + self.static_actions
 
 
 class McPatCpuRegfile(McPatComponent):
 
+    actions = ["read", "write"]
+
     def __init__(self, interface):
         super().__init__(interface)
         phys_size = interface["attributes"]["phys_size"]
         issue_width = interface["attributes"]["issue_width"]
-        action_name = interface["action_name"]
+        action_name = self.activity_action
         if action_name == "read":
             read, write = MUL_FACTOR, 0
         elif action_name == "write":
@@ -504,61 +2278,64 @@ class McPatCpuRegfile(McPatComponent):
         if regfile_type == "int":
             self.properties["system.core0.phy_Regs_IRF_size"] = phys_size
             self.properties["system.core0.peak_issue_width"] = issue_width
-            self.properties["system.core0.int_regfile_reads"] = read
-            self.properties["system.core0.int_regfile_writes"] = write
+            self.stats["system.core0.int_regfile_reads"] = read
+            self.stats["system.core0.int_regfile_writes"] = write
             self.mcpat_patterns = ["Integer RF"]
         elif regfile_type == "fp":
             self.properties["system.core0.phy_Regs_FRF_size"] = phys_size
             self.properties["system.core0.issue_width"] = issue_width
-            self.properties["system.core0.float_regfile_reads"] = read
-            self.properties["system.core0.float_regfile_writes"] = write
+            self.stats["system.core0.float_regfile_reads"] = read
+            self.stats["system.core0.float_regfile_writes"] = write
             self.mcpat_patterns = ["Floating Point RF"]
 
         self.name = "cpu_regfile"
-        self.key = ("cpu_regfile", action_name, regfile_type, *self.global_attrs, phys_size, issue_width)
 
     def attr_supported(self):
         return self.interface["attributes"]["type"] in ["int", "fp"]
 
     def action_supported(self):
-        return self.attr_supported() and self.interface["action_name"] in ["read", "write"]
+        return self.attr_supported() and self.action_name in self.actions + self.static_actions
 
 
 class McPatTlb(McPatComponent):
 
+    actions = ["hit", "miss"]
+    surrogate_attribute = "entries"
+
     def __init__(self, interface):
         super().__init__(interface)
         entries = interface["attributes"]["entries"]
-        action_name = interface["action_name"]
+        action_name = self.activity_action
         if action_name == "hit":
             access, miss = MUL_FACTOR, 0
         elif action_name == "miss":
             access, miss = MUL_FACTOR, MUL_FACTOR
 
         self.properties["system.core0.itlb.number_entries"] = entries
-        self.properties["system.core0.itlb.total_accesses"] = access
-        self.properties["system.core0.itlb.total_misses"] = miss
+        self.stats["system.core0.itlb.total_accesses"] = access
+        self.stats["system.core0.itlb.total_misses"] = miss
 
         self.name = "tlb"
-        self.key = ("tlb", action_name, *self.global_attrs, entries)
         self.mcpat_patterns = ["Itlb"]
 
     def attr_supported(self):
         return True
 
     def action_supported(self):
-        return self.interface["action_name"] in ["hit", "miss"]
+        return self.action_name in self.actions + self.static_actions
 
 
 class McPatRenamingUnit(McPatComponent):
 
+    actions = ["read", "write"]
+
     def __init__(self, interface):
         super().__init__(interface)
         decode_width = interface["attributes"]["decode_width"]
         commit_width = interface["attributes"]["commit_width"]
         phys_irf_size = interface["attributes"]["phys_irf_size"]
         phys_frf_size = interface["attributes"]["phys_frf_size"]
-        action_name = interface["action_name"]
+        action_name = self.activity_action
         if action_name == "read":
             read, write = MUL_FACTOR, 0
         elif action_name == "write":
@@ -568,56 +2345,58 @@ class McPatRenamingUnit(McPatComponent):
         self.properties["system.core0.commit_width"] = decode_width
         self.properties["system.core0.phy_Regs_IRF_size"] = phys_irf_size
         self.properties["system.core0.phy_Regs_FRF_size"] = phys_frf_size
-        self.properties["system.core0.rename_reads"] = read
-        self.properties["system.core0.rename_writes"] = write
-        self.properties["system.core0.fp_rename_reads"] = 0
-        self.properties["system.core0.fp_rename_writes"] = 0
+        self.stats["system.core0.rename_reads"] = read
+        self.stats["system.core0.rename_writes"] = write
+        self.stats["system.core0.fp_rename_reads"] = 0
+        self.stats["system.core0.fp_rename_writes"] = 0
         self.mcpat_patterns = ["Renaming Unit"]
 
         self.name = "renaming_unit"
-        self.key = ("renaming_unit", action_name, *self.global_attrs, decode_width, commit_width, phys_irf_size, phys_frf_size)
 
     def attr_supported(self):
         return True
 
     def action_supported(self):
-        return self.interface["action_name"] in ["read", "write"]
+        return self.action_name in self.actions + self.static_actions
 
 
 class McPatReorderBuffer(McPatComponent):
 
+    actions = ["read", "write"]
+
     def __init__(self, interface):
         super().__init__(interface)
         entries = interface["attributes"]["entries"]
-        action_name = interface["action_name"]
+        action_name = self.activity_action
         if action_name == "read":
             read, write = MUL_FACTOR, 0
         elif action_name == "write":
             read, write = 0, MUL_FACTOR
 
         self.properties["system.core0.ROB_size"] = entries
-        self.properties["system.core0.ROB_reads"] = read
-        self.properties["system.core0.ROB_writes"] = write
+        self.stats["system.core0.ROB_reads"] = read
+        self.stats["system.core0.ROB_writes"] = write
         self.mcpat_patterns = ["ROB"]
 
         self.name = "reorder_buffer"
-        self.key = ("reorder_buffer", action_name, *self.global_attrs, entries)
 
     def attr_supported(self):
         return True
 
     def action_supported(self):
-        return self.interface["action_name"] in ["read", "write"]
+        return self.action_name in self.actions + self.static_actions
 
 
 class McPatLoadStoreQueue(McPatComponent):
 
+    actions = ["load", "store"]
+
     def __init__(self, interface):
         super().__init__(interface)
         entries = interface["attributes"]["entries"]
         ports = interface["attributes"]["ports"]
         queue_type = interface["attributes"]["type"]
-        action_name = interface["action_name"]
+        action_name = self.activity_action
 
         if action_name == "load":
             load_count, store_count = MUL_FACTOR, 0
@@ -631,66 +2410,70 @@ class McPatLoadStoreQueue(McPatComponent):
             self.properties["system.core0.store_buffer_size"] = entries
             self.mcpat_patterns = ["StoreQ"]
         self.properties["system.core0.memory_ports"] = ports
-        self.properties["system.core0.store_instructions"] = load_count
-        self.properties["system.core0.load_instructions"] = store_count
+        self.stats["system.core0.store_instructions"] = load_count
+        self.stats["system.core0.load_instructions"] = store_count
 
         self.name = "load_store_queue"
-        self.key = ("load_store_queue", *self.global_attrs, entries, ports, queue_type)
 
     def attr_supported(self):
         return self.interface["attributes"]["type"] in ["load", "store"]
 
     def action_supported(self):
-        return self.attr_supported() and self.interface["action_name"] in ["load", "store"]
+        return self.attr_supported() and self.action_name in self.actions + self.static_actions
 
 
 class McPatFetchBuffer(McPatComponent):
 
+    actions = ["access"]
+
     def __init__(self, interface):
         super().__init__(interface)
         entries = interface["attributes"]["entries"]
 
         self.properties["system.core0.instruction_buffer_size"] = entries
-        self.properties["system.core0.total_instructions"] = MUL_FACTOR
+        self.stats["system.core0.total_instructions"] = MUL_FACTOR
         self.mcpat_patterns = ["Instruction Buffer"]
 
         self.name = "fetch_buffer"
-        self.key = ("fetch_buffer", *self.global_attrs, entries)
 
     def attr_supported(self):
         return True
 
     def action_supported(self):
-        return self.interface["action_name"] == "access"
+        return self.action_name in self.actions + self.static_actions
 
 
 class McPatDecoder(McPatComponent):
 
+    actions = ["access"]
+
     def __init__(self, interface):
         super().__init__(interface)
         width = interface["attributes"]["width"]
 
         self.properties["system.core0.decode_width"] = width
-        self.properties["system.core0.total_instructions"] = MUL_FACTOR
+        self.stats["system.core0.total_instructions"] = MUL_FACTOR
         self.mcpat_patterns = ["Instruction Decoder"]
 
         self.name = "decoder"
-        self.key = ("decoder", *self.global_attrs, width)
 
     def attr_supported(self):
         return True
 
     def action_supported(self):
-        return self.interface["action_name"] == "access"
+        return self.action_name in self.actions + self.static_actions
 
 
 class McPatInstQueue(McPatComponent):
 
+    actions = ["read", "write", "wakeup"]
+    surrogate_attribute = "entries"
+
     def __init__(self, interface):
         super().__init__(interface)
         entries = interface["attributes"]["entries"]
         issue_width = interface["attributes"]["issue_width"]
-        action_name = interface["action_name"]
+        action_name = self.activity_action
         if action_name == "read":
             read, write, wakeup = MUL_FACTOR, 0, 0
         elif action_name == "write":
@@ -701,26 +2484,25 @@ class McPatInstQueue(McPatComponent):
         queue_type = interface["attributes"]["type"]
         if queue_type == "int":
             self.properties["system.core0.instruction_window_size"] = entries
-            self.properties["system.core0.inst_window_reads"] = read
-            self.properties["system.core0.inst_window_writes"] = write
-            self.properties["system.core0.inst_window_wakeup_accesses"] = wakeup
+            self.stats["system.core0.inst_window_reads"] = read
+            self.stats["system.core0.inst_window_writes"] = write
+            self.stats["system.core0.inst_window_wakeup_accesses"] = wakeup
             self.mcpat_patterns = ["   Instruction Window"]
         elif queue_type == "fp":
             self.properties["system.core0.fp_instruction_window_size"] = entries
-            self.properties["system.core0.fp_inst_window_reads"] = read
-            self.properties["system.core0.fp_inst_window_writes"] = write
-            self.properties["system.core0.fp_inst_window_wakeup_accesses"] = wakeup
+            self.stats["system.core0.fp_inst_window_reads"] = read
+            self.stats["system.core0.fp_inst_window_writes"] = write
+            self.stats["system.core0.fp_inst_window_wakeup_accesses"] = wakeup
             self.mcpat_patterns = ["FP Instruction Window"]
         self.properties["system.core0.peak_issue_width"] = issue_width
 
         self.name = "inst_queue"
-        self.key = ("inst_queue", queue_type, action_name, *self.global_attrs, entries, issue_width)
 
     def attr_supported(self):
         return self.interface["attributes"]["type"] in ["int", "fp"]
 
     def action_supported(self):
-        return self.attr_supported() and self.interface["action_name"] in ["read", "write", "wakeup"]
+        return self.attr_supported() and self.action_name in self.actions + self.static_actions
 
 
 components = {
@@ -738,3 +2520,14 @@ components = {
     "decoder": McPatDecoder,
     "inst_queue": McPatInstQueue,
 }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve McPat estimations to McPatClient over a Unix socket")
+    parser.add_argument("--socket", default=SOCKET_PATH or default_socket_path(),
+                        help="socket path, default %(default)s")
+    parser.add_argument("--cores-per-query", type=int, default=CORES_PER_QUERY)
+    parser.add_argument("--quiet", action="store_true", help="do not print every estimation")
+    args = parser.parse_args()
+    serve(args.socket, cores_per_query=args.cores_per_query, verbose=not args.quiet)
@@ -21,6 +21,7 @@ setup(
     author_email='mwoicik@mit.edu',
     license='MIT',
     install_requires=['pyYAML'],
+    extras_require={'sweep': ['numpy']},
     python_requires='>=3.6',
     data_files=[
         ('share/accelergy/estimation_plug_ins/accelergy-mcpat-plug-in',
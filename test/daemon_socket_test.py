@@ -0,0 +1,88 @@
+import sys
+import os
+import shutil
+import socket
+import tempfile
+import time
+from multiprocessing import Process, Queue
+sys.path.insert(0, "..")
+from mcpat_wrapper import *
+
+OTHER_UID = 65534  # nobody
+
+interface = {"class_name": "cache", "action_name": "read_hit", "arguments": None,
+             "attributes": {"technology": "45nm", "datawidth": 32, "clockrate": 999, "device_type": "lop",
+                            "n_banks": 1, "size": 4096, "associativity": 2, "data_latency": 2, "block_size": 64,
+                            "mshr_size": 4, "write_buffer_size": 8, "cache_type": "icache"}}
+
+
+def listen(socket_path, uid, received):
+    # a stand-in for the daemon, it passes on every request line it gets and answers 42
+    if uid is not None:
+        os.setuid(uid)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    while True:
+        connection, _ = server.accept()
+        line = connection.makefile("rb").readline()
+        received.put(line)
+        if line:
+            connection.sendall(b'{"result": 42}\n')
+
+
+def start_listener(socket_path, uid=None):
+    received = Queue()
+    listener = Process(target=listen, args=(socket_path, uid, received), daemon=True)
+    listener.start()
+    while not os.path.exists(socket_path):
+        time.sleep(0.01)
+    return listener, received
+
+
+def ask(socket_path):
+    # the accuracy the client answers with, and whether it connected to the socket
+    client = McPatClient(socket_path, verbose=False, cache_dir=tempfile.mkdtemp(dir=test_dir))
+    return client.primitive_action_supported(interface), client.wrapper is None
+
+
+test_dir = tempfile.mkdtemp()
+os.chmod(test_dir, 0o755)
+
+# a socket of this user, served by this user, answers the queries
+socket_path = os.path.join(tempfile.mkdtemp(dir=test_dir), "own.sock")
+listener, received = start_listener(socket_path)
+accuracy, connected = ask(socket_path)
+print("own socket, answer               ", accuracy, connected)
+assert accuracy == 42 and connected and received.get(timeout=5)
+
+# a file that is no socket is left alone, the client answers from a wrapper of its own
+socket_path = os.path.join(tempfile.mkdtemp(dir=test_dir), "file.sock")
+open(socket_path, "w").close()
+accuracy, connected = ask(socket_path)
+print("regular file, answer             ", accuracy, connected)
+assert accuracy == MCPAT_ACCURACY and not connected
+
+if os.getuid() != 0:
+    print("not running as root, sockets of another user are not tested")
+else:
+    # a socket owned by another user is not connected to
+    socket_path = os.path.join(tempfile.mkdtemp(dir=test_dir), "foreign.sock")
+    listener, received = start_listener(socket_path)
+    os.chown(socket_path, OTHER_UID, OTHER_UID)
+    accuracy, connected = ask(socket_path)
+    print("foreign socket, answer           ", accuracy, connected)
+    assert accuracy == MCPAT_ACCURACY and not connected and received.empty()
+
+    # a socket file of this user, served by another user's process, gets no request
+    socket_dir = tempfile.mkdtemp(dir=test_dir)
+    os.chmod(socket_dir, 0o777)
+    socket_path = os.path.join(socket_dir, "swapped.sock")
+    listener, received = start_listener(socket_path, OTHER_UID)
+    os.chown(socket_path, os.getuid(), os.getgid())
+    accuracy, connected = ask(socket_path)
+    request = received.get(timeout=5)
+    print("foreign peer, request received   ", request)
+    assert accuracy == MCPAT_ACCURACY and not connected and request == b""
+
+shutil.rmtree(test_dir)
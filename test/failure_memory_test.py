@@ -0,0 +1,89 @@
+import sys
+import os
+import shutil
+import tempfile
+sys.path.insert(0, "..")
+from mcpat_wrapper import *
+
+REPORT = """Processor:
+  Area = 10.5 mm^2
+  Runtime Dynamic = 1.2 W
+
+*****************************************************************************************
+Core:
+      Area = 8.0 mm^2
+      Runtime Dynamic = 1.0 W
+
+          Instruction Cache:
+            Area = 1.5 mm^2
+            Peak Dynamic = 0.2 W
+            Subthreshold Leakage = 0.01 W
+            Gate Leakage = 0.002 W
+            Runtime Dynamic = 0.08 W
+"""
+
+# stand-ins for McPat, each one logs its runs, so no McPat executable is needed
+FAKES = {
+    "ok": "cat <<'REPORT'\n%sREPORT\n" % REPORT,
+    "hang": "exec sleep 100\n",
+    "fail": 'echo "no valid organization" >&2\nexit 2\n',
+    # exits normally without the unit the query asks for
+    "incomplete": "cat <<'REPORT'\n%sREPORT\n" % REPORT.split("\n\n")[0],
+}
+
+interface = {"class_name": "cache", "action_name": "read_hit", "arguments": None,
+             "attributes": {"technology": "45nm", "datawidth": 32, "clockrate": 999, "device_type": "lop",
+                            "n_banks": 1, "size": 4096, "associativity": 2, "data_latency": 2, "block_size": 64,
+                            "mshr_size": 4, "write_buffer_size": 8, "cache_type": "icache"}}
+
+fake_dir = tempfile.mkdtemp()
+os.environ["FAKE_DIR"] = fake_dir
+for name, body in FAKES.items():
+    with open(os.path.join(fake_dir, name), "w") as file:
+        file.write('#!/bin/sh\necho %s >> "$FAKE_DIR/runs"\n%s' % (name, body))
+    os.chmod(os.path.join(fake_dir, name), 0o755)
+
+
+def runs():
+    # the runs logged since the last call
+    if not os.path.exists(os.path.join(fake_dir, "runs")):
+        return 0
+    with open(os.path.join(fake_dir, "runs")) as file:
+        count = len(file.readlines())
+    os.remove(file.name)
+    return count
+
+
+def query(cache_dir, backend, fake):
+    # (error type or None, accuracy reported afterwards, McPat runs)
+    wrapper = McPatWrapper(verbose=False, cache_dir=cache_dir, cache_backend=backend, timeout=0.5, retries=0,
+                           exec_path=os.path.join(fake_dir, fake))
+    try:
+        wrapper.estimate_energy(interface)
+        error = None
+    except McPatError as raised:
+        error = type(raised)
+    return error, wrapper.primitive_action_supported(interface), runs()
+
+
+for backend in cache_backends:
+    # a timeout says nothing about the configuration, it is not recorded and the next query runs McPat again
+    cache_dir = tempfile.mkdtemp(dir=fake_dir)
+    error, accuracy, _ = query(cache_dir, backend, "hang")
+    print("%-6s timed out, then supported       " % backend, error.__name__, accuracy)
+    assert error is McPatInterrupted and accuracy == MCPAT_ACCURACY
+    error, accuracy, count = query(cache_dir, backend, "ok")
+    print("%-6s next query runs McPat           " % backend, count)
+    assert error is None and count == 1
+
+    # a configuration McPat fails on is recorded, reported unsupported and not run again
+    for fake in ("fail", "incomplete"):
+        cache_dir = tempfile.mkdtemp(dir=fake_dir)
+        error, accuracy, _ = query(cache_dir, backend, fake)
+        print("%-6s %-10s then supported       " % (backend, fake), error.__name__, accuracy)
+        assert error is McPatError and accuracy == 0
+        error, accuracy, count = query(cache_dir, backend, "ok")
+        print("%-6s %-10s runs after failing   " % (backend, fake), count)
+        assert error is McPatError and accuracy == 0 and count == 0
+
+shutil.rmtree(fake_dir)
@@ -0,0 +1,61 @@
+import subprocess
+import sys
+import statistics
+import tempfile
+
+RUNS = 20
+
+# each run uses a fresh interpreter, so nothing is imported or parsed in advance. The template parse timed
+# after the import is the work the first McPat query does, older revisions did it while importing.
+IMPORT = """
+import time
+start = time.perf_counter()
+import mcpat_wrapper
+imported = time.perf_counter()
+if hasattr(mcpat_wrapper.Properties, "template"):
+    mcpat_wrapper.Properties.template()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+SUPPORT_CHECK = """
+import sys
+import tempfile
+import mcpat_wrapper
+wrapper = mcpat_wrapper.McPatWrapper(verbose=False, cache_dir=tempfile.mkdtemp())
+wrapper.primitive_action_supported({
+    "class_name": "tlb",
+    "attributes": {"technology": "45nm", "datawidth": 32, "clockrate": 999, "device_type": "lop", "entries": 64},
+    "action_name": "hit",
+    "arguments": "None"
+})
+print(" ".join(name for name in ("xml.etree.ElementTree", "asyncio", "socketserver") if name in sys.modules))
+"""
+
+
+def time_import(directory):
+    # median import and template parse times in ms
+    import_times = []
+    template_times = []
+    for _ in range(RUNS):
+        output = subprocess.check_output([sys.executable, "-c", IMPORT], cwd=directory).split()
+        import_times.append(float(output[0]) * 1000)
+        template_times.append(float(output[1]) * 1000)
+    return statistics.median(import_times), statistics.median(template_times)
+
+
+imported, template = time_import("..")
+print("import                             %.2f ms" % imported)
+print("template parse, first query only   %.2f ms" % template)
+
+# the import of an earlier revision, given as the first argument, e.g. python3 import_benchmark.py HEAD~10
+if len(sys.argv) > 1:
+    revision = sys.argv[1]
+    with tempfile.TemporaryDirectory() as revision_dir:
+        archive = subprocess.check_output(["git", "archive", revision, "mcpat_wrapper.py", "properties.xml"], cwd="..")
+        subprocess.run(["tar", "-x", "-C", revision_dir], input=archive, check=True)
+        print("import at %-24s %.2f ms" % (revision, time_import(revision_dir)[0]))
+
+# XML is only needed to build McPat input, asyncio and socketserver only by the async interface and the daemon
+loaded = subprocess.check_output([sys.executable, "-c", SUPPORT_CHECK], cwd="..").decode().split()
+print("loaded by a support check          %s" % (" ".join(loaded) or "nothing deferred"))
+assert not loaded
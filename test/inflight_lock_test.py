@@ -0,0 +1,56 @@
+import sys
+import random
+import shutil
+import tempfile
+import threading
+from multiprocessing import Process
+sys.path.insert(0, "..")
+from mcpat_wrapper import *
+
+PROCESSES = 4
+THREADS = 8
+ROUNDS = 200
+
+
+def hold_stripes(cache_dir, process):
+    # every thread holds several stripes at once and writes to the shared cache while holding them, as the threads
+    # of estimate_batch do. A per-process lock would make the kernel report deadlocks that do not exist.
+    inflight = InflightLocks(cache_dir)
+    cache = SharedCache(cache_dir)
+    failures = []
+
+    def worker(thread):
+        try:
+            for i in range(ROUNDS):
+                keys = ["%08x" % random.randrange(16 ** 8) for _ in range(random.randint(1, 4))]
+                with inflight.hold(keys):
+                    cache.put("key-%d-%d-%d" % (process, thread, i), 1.0, 2.0)
+        except OSError as error:
+            failures.append(error)
+
+    threads = [threading.Thread(target=worker, args=(thread,)) for thread in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sys.exit(1 if failures else 0)
+
+
+cache_dir = tempfile.mkdtemp()
+InflightLocks.stripes = 8  # few stripes, so holders contend for them all the time
+processes = [Process(target=hold_stripes, args=(cache_dir, process)) for process in range(PROCESSES)]
+for process in processes:
+    process.start()
+for process in processes:
+    process.join()
+
+failed = sum(process.exitcode != 0 for process in processes)
+print("processes failing to take a lock ", failed, "of", PROCESSES)
+assert failed == 0
+cache = SharedCache(cache_dir)
+found = sum(cache.get("key-%d-%d-%d" % (process, thread, i)) == (1.0, 2.0)
+            for process in range(PROCESSES) for thread in range(THREADS) for i in range(ROUNDS))
+print("entries written while holding    ", found, "of", PROCESSES * THREADS * ROUNDS)
+assert found == PROCESSES * THREADS * ROUNDS
+
+shutil.rmtree(cache_dir)
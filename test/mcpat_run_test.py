@@ -0,0 +1,87 @@
+import sys
+import os
+import asyncio
+import shutil
+import tempfile
+sys.path.insert(0, "..")
+import mcpat_wrapper
+from mcpat_wrapper import *
+
+# stand-ins for McPat, each one logs its runs, so no McPat executable is needed
+FAKES = {
+    # leaves a child behind that outlives the fake unless its whole process group is killed
+    "hang": 'sleep 100 &\necho $! >> "$FAKE_DIR/children"\nwait\n',
+    "fail": 'echo "no valid organization" >&2\nexit 2\n',
+    "killed": 'kill -9 $$\n',
+}
+
+interface = {"class_name": "cache", "action_name": "read_hit", "arguments": None,
+             "attributes": {"technology": "45nm", "datawidth": 32, "clockrate": 999, "device_type": "lop",
+                            "n_banks": 1, "size": 4096, "associativity": 2, "data_latency": 2, "block_size": 64,
+                            "mshr_size": 4, "write_buffer_size": 8, "cache_type": "icache"}}
+
+fake_dir = tempfile.mkdtemp()
+os.environ["FAKE_DIR"] = fake_dir
+for name, body in FAKES.items():
+    with open(os.path.join(fake_dir, name), "w") as file:
+        file.write('#!/bin/sh\necho %s >> "$FAKE_DIR/runs"\n%s' % (name, body))
+    os.chmod(os.path.join(fake_dir, name), 0o755)
+mcpat_wrapper.RETRY_BACKOFF = 0.01
+
+
+def runs():
+    # the runs logged since the last call
+    with open(os.path.join(fake_dir, "runs")) as file:
+        count = len(file.readlines())
+    os.remove(file.name)
+    return count
+
+
+def running(pid):
+    # a killed child reparented to an init that does not reap it stays behind as a zombie
+    try:
+        with open("/proc/%d/stat" % pid) as file:
+            return file.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def raised(fake, asynchronous, **arguments):
+    wrapper = McPatWrapper(verbose=False, cache_dir=tempfile.mkdtemp(dir=fake_dir),
+                           exec_path=os.path.join(fake_dir, fake), **arguments)
+    try:
+        if asynchronous:
+            asyncio.run(wrapper.estimate_energy_async(interface))
+        else:
+            wrapper.estimate_energy(interface)
+    except McPatError as error:
+        return type(error)
+    return None
+
+
+for asynchronous in (False, True):
+    mode = "async" if asynchronous else "sync "
+    # a run that hangs is killed with every process it started, and retried
+    error = raised("hang", asynchronous, timeout=0.5, retries=1)
+    attempts = runs()
+    with open(os.path.join(fake_dir, "children")) as file:
+        children = [int(line) for line in file]
+        os.remove(file.name)
+    print(mode, "hanging runs, error raised       ", attempts, error.__name__)
+    print(mode, "children still running           ", sum(running(pid) for pid in children), "of", len(children))
+    assert error is McPatInterrupted and attempts == len(children) == 2
+    assert not any(running(pid) for pid in children)
+
+    # a run killed by a signal is retried
+    error = raised("killed", asynchronous, retries=2)
+    attempts = runs()
+    print(mode, "runs killed by a signal          ", attempts, error.__name__)
+    assert error is McPatInterrupted and attempts == 3
+
+    # a non-zero exit status would come back on every attempt, it is raised right away
+    error = raised("fail", asynchronous, retries=2)
+    attempts = runs()
+    print(mode, "runs exiting with status 2       ", attempts, error.__name__)
+    assert error is McPatError and attempts == 1
+
+shutil.rmtree(fake_dir)
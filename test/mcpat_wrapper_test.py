@@ -1,4 +1,6 @@
 import sys
+import shutil
+import tempfile
 sys.path.insert(0, "..")
 from mcpat_wrapper import *
 
@@ -175,6 +177,14 @@ req = {
 print("xbar access")
 test(req)
 
+# an area interface has no action
+area_req = {"class_name": req["class_name"], "attributes": req["attributes"]}
+print("xbar area interface")
+print("area supported   ", wrapper.primitive_area_supported(area_req))
+print("area             ", wrapper.estimate_area(area_req), "mm^2\n")
+assert wrapper.primitive_area_supported(area_req) == MCPAT_ACCURACY
+assert wrapper.estimate_area(area_req) == wrapper.estimate_area(req)
+
 # tournament_bp
 req = {
     "class_name": "tournament_bp",
@@ -397,3 +407,50 @@ test(req)
 req["action_name"] = "wakeup"
 print("inst_queue fp wakeup")
 test(req)
+
+
+# batch estimation
+req = {
+    "class_name": "reorder_buffer",
+    "attributes":{
+        **glob_attrs,
+        "entries": 96
+    },
+    "action_name":"read",
+    "arguments":"None"
+}
+batch = [req, {**req, "action_name": "write"}, req]
+print("batch reorder_buffer read, write, read")
+print("batch energy     ", wrapper.estimate_batch(batch, max_workers=4), "pJ\n")
+
+# a cache of its own, so the packed run cannot read the results of the single runs
+packing_dir = tempfile.mkdtemp()
+packing_wrapper = McPatWrapper(clean_output_files=True, verbose=False, cores_per_query=8, cache_dir=packing_dir)
+req = {
+    "class_name": "tlb",
+    "attributes":{
+        **glob_attrs,
+        "entries": 32
+    },
+    "action_name":"hit",
+    "arguments":"None"
+}
+batch = [req, {**req, "action_name": "miss"}, {**req, "attributes": {**req["attributes"], "entries": 128}}]
+print("packed batch tlb hit, miss, hit 128 entries")
+packed = packing_wrapper.estimate_batch(batch)
+print("batch energy     ", packed, "pJ\n")
+assert packed == wrapper.estimate_batch(batch)  # every core section is attributed to its own query
+shutil.rmtree(packing_dir)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+if numpy is not None:
+    base = {**glob_attrs, "cache_type": "dcache", "n_banks": 1, "data_latency": 2, "block_size": 64, "mshr_size": 4,
+            "write_buffer_size": 8}
+    energy, area = wrapper.sweep("cache", base, {"size": [16384, 65536], "associativity": [2, 8]},
+                                 ["read_hit", "write_miss"], max_workers=4)
+    print("sweep cache size x associativity, read_hit and write_miss")
+    print("sweep energy     ", energy.tolist(), "pJ")
+    print("sweep area       ", area.tolist(), "mm^2\n")
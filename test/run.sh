@@ -1 +1,6 @@
 python3 mcpat_wrapper_test.py | tee test_log.txt
+python3 shared_cache_test.py
+python3 inflight_lock_test.py
+python3 mcpat_run_test.py
+python3 failure_memory_test.py
+python3 daemon_socket_test.py
@@ -0,0 +1,64 @@
+import sys
+import os
+import shutil
+import tempfile
+from multiprocessing import Process
+sys.path.insert(0, "..")
+from mcpat_wrapper import *
+
+WRITERS = 8
+ENTRIES = 200
+
+
+def write_entries(cache_dir, writer):
+    cache = SharedCache(cache_dir)
+    for i in range(ENTRIES):
+        cache.put("key-%d-%d" % (writer, i), float(i), float(writer), "area-%d" % writer)
+
+
+cache_dir = tempfile.mkdtemp()
+
+# several processes appending to the same journal at once
+writers = [Process(target=write_entries, args=(cache_dir, writer)) for writer in range(WRITERS)]
+for process in writers:
+    process.start()
+for process in writers:
+    process.join()
+
+cache = SharedCache(cache_dir)
+found = sum(cache.get("key-%d-%d" % (writer, i)) == (float(i), float(writer))
+            for writer in range(WRITERS) for i in range(ENTRIES))
+print("entries written by %d processes " % WRITERS, found, "of", WRITERS * ENTRIES)
+assert found == WRITERS * ENTRIES
+assert cache.get_area("area-3") == 3.0
+
+# a writer that crashed halfway through a line
+with open(os.path.join(cache_dir, ".cache.journal"), "ab") as file:
+    file.write(b"0badc0de [\"torn")
+cache.put("after-torn", 1.0, 2.0)
+cache = SharedCache(cache_dir)
+print("entry after torn line            ", cache.get("after-torn"))
+assert cache.get("after-torn") == (1.0, 2.0)
+assert cache.get("key-0-0") == (0.0, 0.0)
+
+# compaction drops superseded lines and keeps every entry
+for i in range(ENTRIES):
+    cache.put("key-0-%d" % i, -1.0, 0.0)
+with cache.lock:
+    cache.compact()
+cache = SharedCache(cache_dir)
+lines = sum(1 for _ in open(os.path.join(cache_dir, ".cache.journal")))
+print("lines after compaction           ", lines)
+assert lines == WRITERS * ENTRIES + 1
+assert cache.get("key-0-5") == (-1.0, 0.0)
+assert cache.get("key-7-5") == (5.0, 7.0)
+
+# reports are files of their own, not journal lines every process reads
+cache.put_report("input-0", [["Processor", {"Area": 1.0}]])
+cache = SharedCache(cache_dir)
+print("report read by another instance  ", cache.get_report("input-0"))
+assert cache.get_report("input-0") == [["Processor", {"Area": 1.0}]]
+assert cache.get_report("input-1") is None
+assert sum(1 for _ in open(os.path.join(cache_dir, ".cache.journal"))) == lines
+
+shutil.rmtree(cache_dir)
@@ -0,0 +1,81 @@
+import sys
+import shutil
+import tempfile
+import time
+sys.path.insert(0, "..")
+import mcpat_wrapper
+from mcpat_wrapper import *
+
+RUNS = 3
+
+glob_attrs = {
+    "technology": "45nm",
+    "datawidth": 32,
+    "clockrate": 999,
+    "device_type": "lop"
+}
+cache_attrs = {"n_banks": 1, "size": 65536, "associativity": 2, "data_latency": 2, "block_size": 64, "mshr_size": 4,
+               "write_buffer_size": 8}
+
+interfaces = [
+    ("cache", {**cache_attrs, "cache_type": "icache"}, "read_hit"),
+    ("cache", {**cache_attrs, "cache_type": "dcache"}, "read_hit"),
+    ("cache", {**cache_attrs, "cache_type": "l2cache", "size": 2097152, "associativity": 8, "n_banks": 4}, "read_hit"),
+    ("func_unit", {"type": "int_alu"}, "access"),
+    ("xbar", {"horizontal_nodes": 1, "vertical_nodes": 1, "link_throughput": 1, "link_latency": 2, "flit_bytes": 16},
+     "access"),
+    ("tournament_bp", {"local_pred_entries": 2048, "local_pred_bits": 2, "global_pred_entries": 8192,
+                       "global_pred_bits": 2, "choice_pred_entries": 8192, "choice_pred_bits": 2}, "hit"),
+    ("btb", {"entries": 4096, "block_width": 4, "associativity": 2, "banks": 2}, "read"),
+    ("cpu_regfile", {"type": "int", "phys_size": 256, "issue_width": 8}, "read"),
+    ("tlb", {"entries": 64}, "hit"),
+    ("renaming_unit", {"decode_width": 8, "commit_width": 8, "phys_irf_size": 256, "phys_frf_size": 256}, "read"),
+    ("reorder_buffer", {"entries": 192}, "read"),
+    ("load_store_queue", {"entries": 32, "type": "load", "ports": 2}, "load"),
+    ("fetch_buffer", {"entries": 64}, "access"),
+    ("decoder", {"width": 8}, "access"),
+    ("inst_queue", {"type": "int", "entries": 32, "issue_width": 8}, "read"),
+]
+
+cache_dir = tempfile.mkdtemp()
+wrapper = McPatWrapper(verbose=False, cache_dir=cache_dir)
+if wrapper.exec_path is None:
+    print("McPAT executable not found, nothing to compare")
+    sys.exit(1)  # equal results are unproven until this runs against McPAT
+
+
+def timed_query(component):
+    # the best of several runs, each one a fresh McPat process
+    best, result = None, None
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = wrapper.query_mcpat(component)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+differing = []
+print("%-28s %10s %10s %8s  %s" % ("component", "full ms", "minimal ms", "speedup", "equal"))
+for class_name, attributes, action_name in interfaces:
+    interface = {"class_name": class_name, "attributes": {**glob_attrs, **attributes}, "action_name": action_name,
+                 "arguments": "None"}
+    # components read MINIMAL_SYSTEM when they are created
+    mcpat_wrapper.MINIMAL_SYSTEM = False
+    full_component = components[class_name](interface)
+    mcpat_wrapper.MINIMAL_SYSTEM = True
+    component = components[class_name](interface)
+
+    full_time, full_result = timed_query(full_component)
+    minimal_time, minimal_result = timed_query(component)
+    name = "%s %s" % (class_name, attributes.get("cache_type", attributes.get("type", "")))
+    print("%-28s %10.1f %10.1f %7.1fx  %s" % (name, full_time, minimal_time, full_time / minimal_time,
+                                             full_result == minimal_result))
+    if full_result != minimal_result:
+        differing.append((name, full_result, minimal_result))
+
+shutil.rmtree(cache_dir)
+# (energy, area, leakage) must not depend on the units the minimal system leaves out
+for name, full_result, minimal_result in differing:
+    print("%s differs: full system %s, minimal system %s" % (name, full_result, minimal_result))
+sys.exit(1 if differing else 0)